@@ -0,0 +1,292 @@
+"""HTTP API for the recommendation engine.
+
+Pre-forks ``--workers`` processes that accept connections from one shared
+listening socket; each worker serves requests on threads and keeps its own
+engine (scheduler, connection pool, in-memory caches) on top of the shared
+on-disk cache.
+
+    python -m api --port 8000 --workers 4
+
+    GET  /health
+    GET  /moods
+    GET  /geocode?city=Paris
+    GET  /weather?location=48.85,2.35 | ?city=Paris
+    GET  /recommendations?location=48.85,2.35&mood=bored[&radius=5000&min_rating=4]
+    GET  /popular?location=48.85,2.35[&radius=5000]
+    GET  /places/<place_id>
+    GET  /photos/<photo_reference>[?thumbnail=1]
+    GET  /itinerary?place_ids=<id>,<id>,...[&location=48.85,2.35&mode=walking&day=0&start=09:00&visit=45]
+    POST /recommendations/batch  {"queries": [{"location" | "city", "mood", ...}, ...]}
+    GET  /metrics  (Prometheus text format, for the worker that answers)
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import metrics
+from itinerary import MINUTES_PER_DAY, TRAVEL_SPEEDS, VISIT_MINUTES
+
+MAX_BATCH_SIZE = 200
+MAX_ITINERARY_STOPS = 200
+MAX_BODY_BYTES = 1024 * 1024
+
+# Imported per worker after the fork, so no threads or SQLite handles are shared across processes
+engine = None
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _float(params, name, default):
+    try:
+        return float(params.get(name, default))
+    except ValueError:
+        raise ApiError(400, f"{name} must be a number")
+
+
+def _location(params):
+    location = engine.resolve_location(params.get("location"), params.get("city"))
+    if location is None:
+        raise ApiError(404 if params.get("city") else 400, "location not found")
+    return location
+
+
+def _search(params, rated=True):
+    """Validated ``(radius, min_rating)`` from the query string; ``min_rating`` is ignored unless ``rated``."""
+    try:
+        return engine.validate_search(params.get("radius", engine.DEFAULT_RADIUS),
+                                      params.get("min_rating", 4.0) if rated else 4.0)
+    except ValueError as exc:
+        raise ApiError(400, str(exc))
+
+
+def health(params):
+    return {"status": "ok", "pid": os.getpid()}
+
+
+def moods(params):
+    return engine.MOOD_ACTIVITIES
+
+
+def geocode(params):
+    return {"location": _location(params)}
+
+
+def weather(params):
+    data = engine.weather_for(_location(params), params.get("city"))
+    if data is None:
+        raise ApiError(404, "weather not available")
+    return data
+
+
+def recommendations(params):
+    radius, min_rating = _search(params)
+    mood = params.get("mood")
+    if mood not in engine.MOOD_ACTIVITIES:
+        raise ApiError(400, f"unknown mood: {mood}")
+    location = _location(params)
+    data = engine.weather_for(location, params.get("city"))
+    places = engine.recommend(location, mood, radius=radius, min_rating=min_rating, weather=data)
+    return {"location": location, "mood": mood, "weather": data, "places": places}
+
+
+def popular(params):
+    radius, _ = _search(params, rated=False)
+    location = _location(params)
+    places = engine.get_popular_places(location, radius=radius)
+    return {"location": location, "places": [place.to_dict() for place in places]}
+
+
+def itinerary(params):
+    place_ids = [p for p in params.get("place_ids", "").split(",") if p]
+    if not place_ids:
+        raise ApiError(400, "place_ids is required")
+    if len(place_ids) > MAX_ITINERARY_STOPS:
+        raise ApiError(413, f"at most {MAX_ITINERARY_STOPS} places per itinerary")
+    location = _location(params) if params.get("location") or params.get("city") else None
+    mode = params.get("mode", "walking")
+    if mode not in TRAVEL_SPEEDS:
+        raise ApiError(400, f"unknown mode: {mode}")
+    start = params.get("start", "09:00")
+    hour, _, minute = start.partition(":")
+    if not (len(hour) == len(minute) == 2 and hour.isdigit() and minute.isdigit()
+            and int(hour) < 24 and int(minute) < 60):
+        raise ApiError(400, "start must be HH:MM between 00:00 and 23:59")
+    # day: 0 is Sunday, as in Places opening hours
+    day = params.get("day", "0")
+    if day not in ("0", "1", "2", "3", "4", "5", "6"):
+        raise ApiError(400, "day must be an integer between 0 (Sunday) and 6")
+    visit_minutes = _float(params, "visit", VISIT_MINUTES)
+    if not 0 < visit_minutes <= MINUTES_PER_DAY:
+        raise ApiError(400, f"visit must be between 0 and {MINUTES_PER_DAY} minutes")
+    start_minute = int(day) * MINUTES_PER_DAY + int(hour) * 60 + int(minute)
+    return engine.plan_itinerary(place_ids, location, start_minute=start_minute, mode=mode,
+                                 visit_minutes=visit_minutes)
+
+
+def batch(body):
+    queries = body.get("queries") if isinstance(body, dict) else None
+    if not isinstance(queries, list) or not all(isinstance(q, dict) for q in queries):
+        raise ApiError(400, 'expected {"queries": [{"location" | "city", "mood"}, ...]}')
+    if len(queries) > MAX_BATCH_SIZE:
+        raise ApiError(413, f"at most {MAX_BATCH_SIZE} queries per batch")
+    try:
+        return {"results": engine.recommend_batch(queries)}
+    except ValueError as exc:
+        raise ApiError(400, str(exc))
+
+
+GET_ROUTES = {
+    "/health": health,
+    "/moods": moods,
+    "/geocode": geocode,
+    "/weather": weather,
+    "/recommendations": recommendations,
+    "/popular": popular,
+    "/itinerary": itinerary,
+}
+POST_ROUTES = {
+    "/recommendations/batch": batch,
+}
+
+
+def _route(path):
+    """Metrics label for a request path, with ids collapsed."""
+    path = urlparse(path).path
+    for prefix in ("/places/", "/photos/"):
+        if path.startswith(prefix):
+            return prefix.rstrip("/")
+    return path if path in GET_ROUTES or path in POST_ROUTES or path == "/metrics" else "other"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        with metrics.span("api_request", method="GET", route=_route(self.path)):
+            self._get()
+
+    def do_POST(self):
+        with metrics.span("api_request", method="POST", route=_route(self.path)):
+            self._post()
+
+    def _get(self):
+        parsed = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        try:
+            if parsed.path == "/metrics":
+                self._send(200, metrics.render_prometheus().encode(), "text/plain; version=0.0.4")
+            elif parsed.path.startswith("/places/"):
+                self._send_json(200, engine.get_place_details(unquote(parsed.path[len("/places/"):])))
+            elif parsed.path.startswith("/photos/"):
+                photo_ref = unquote(parsed.path[len("/photos/"):])
+                data = engine.get_photo(photo_ref, thumbnail=params.get("thumbnail") in ("1", "true"))
+                if data is None:
+                    raise ApiError(404, "photo not available")
+                self._send(200, data, "image/jpeg")
+            elif parsed.path in GET_ROUTES:
+                self._send_json(200, GET_ROUTES[parsed.path](params))
+            else:
+                raise ApiError(404, "not found")
+        except ApiError as exc:
+            self._send_json(exc.status, {"error": str(exc)})
+        except Exception:
+            self._send_json(500, {"error": "internal error"})
+
+    def _post(self):
+        path = urlparse(self.path).path
+        try:
+            if path not in POST_ROUTES:
+                raise ApiError(404, "not found")
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                raise ApiError(413, "request body too large")
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                raise ApiError(400, "request body must be JSON")
+            self._send_json(200, POST_ROUTES[path](body))
+        except ApiError as exc:
+            self._send_json(exc.status, {"error": str(exc)})
+        except Exception:
+            self._send_json(500, {"error": "internal error"})
+
+    def _send_json(self, status, body):
+        self._send(status, json.dumps(body).encode(), "application/json")
+
+    def _send(self, status, payload, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def run_worker(server):
+    global engine
+    import engine as engine_module
+    engine = engine_module
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(host="127.0.0.1", port=8000, workers=1):
+    """Bind once, then fork ``workers`` processes that all accept on the socket."""
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    print(f"Engine API listening on http://{server.server_address[0]}:{server.server_address[1]} "
+          f"with {workers} worker(s)", flush=True)
+    if workers <= 1:
+        run_worker(server)
+        return
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+            run_worker(server)
+            os._exit(0)
+        children.append(pid)
+
+    def stop(*_):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        stop()
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes sharing the listening socket")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,191 +1,134 @@
 import streamlit as st
-import requests
+import datetime
 import os
-from math import radians, sin, cos, sqrt, atan2
-from dotenv import load_dotenv
+import re
+import time
+import uuid
+from functools import wraps
 from streamlit_geolocation import streamlit_geolocation
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor
-
-# Load API keys
-load_dotenv()
-OPENWEATHERMAP_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
-GOOGLE_PLACES_API_KEY = os.getenv("GOOGLE_PLACES_API_KEY")
+import metrics
+from cache import all_caches
+from favorites import get_favorites_store
+from engine import (
+    MOOD_ACTIVITIES, FETCH_SCHEDULER, PLACE_INDEX, geocode_city, get_weather, get_clothing_advice,
+    get_place_details, get_photo, warm_card_photos, stream_nearby_places, get_popular_places,
+    generate_feedback, plan_itinerary,
+)
+from itinerary import MINUTES_PER_DAY, TRAVEL_SPEEDS, VISIT_MINUTES
+from scheduler import PRIORITY_HIGH, PRIORITY_LOW
 
 # Constants
-MOOD_ACTIVITIES = {
-    "bored": ["park", "museum", "amusement_park", "movie_theater"],
-    "excited": ["amusement_park", "stadium", "casino", "bowling_alley"],
-    "hungry": ["restaurant", "cafe", "bakery", "food_court"],
-    "romantic": ["spa", "restaurant", "park", "art_gallery"],
-    "adventurous": ["hiking_trail", "campground", "ski_resort", "climbing_gym"],
-    "cultural": ["museum", "art_gallery", "place_of_worship", "cultural_center"],
-    "shopping": ["shopping_mall", "clothing_store", "jewelry_store", "market"],
-    "relaxed": ["spa", "library", "book_store", "park"],
-    "sporty": ["gym", "stadium", "sports_complex", "swimming_pool"],
-    "nature": ["park", "zoo", "botanical_garden", "beach"],
-    "historical": ["temples","museum", "monument", "historical_landmark", "archaeological_site"],
-    "social": ["bar", "night_club", "bowling_alley", "karaoke_bar"],
-    "family": ["aquarium", "zoo", "playground", "family_entertainment_center"]
-}
-
-POPULAR_CATEGORIES = [
-    "tourist_attraction", "museum", "park", "landmark",
-    "shopping_mall", "art_gallery", "zoo", "church"
-]
-
-DEFAULT_RADIUS = 5000  # meters
-MAX_CONCURRENT_REQUESTS = 5
-PLACE_DETAILS_CACHE = {}
+PREFETCH_LIMIT = 6  # top results per section whose details are prefetched
+WEATHER_REFRESH_INTERVAL = 10 * 60  # seconds between weather panel refreshes
+FAVORITES = get_favorites_store()
+PLACEHOLDER_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "placeholder.png")
+
+# Prometheus scrape endpoint for this Streamlit process, e.g. METRICS_PORT=9100
+METRICS_PORT = os.getenv("METRICS_PORT")
+if METRICS_PORT:
+    metrics.serve(int(METRICS_PORT))
 
 # --------------------------
-# Weather Functions
+# Display Functions
 # --------------------------
 
-def get_weather(city):
-    base_url = "http://api.openweathermap.org/data/2.5/weather?"
-    complete_url = f"{base_url}q={city}&appid={OPENWEATHERMAP_API_KEY}&units=metric"
-    
-    try:
-        response = requests.get(complete_url, timeout=10)
-        data = response.json()
-        if data["cod"] != "404":
-            main = data["main"]
-            weather = {
-                "temp": main["temp"],
-                "feels_like": main["feels_like"],
-                "humidity": main["humidity"],
-                "main": data["weather"][0]["main"]
-            }
-            return weather
-        return None
-    except:
-        return None
-
-def get_clothing_advice(temp):
-    if temp > 25:
-        return "Light clothing 🩳👕 and sunscreen"
-    elif temp > 15:
-        return "Light jacket 🧥 or sweater"
+def show_card_image(place, fetch=True):
+    photo_ref = place.photo_reference
+    image = get_photo(photo_ref, thumbnail=True, fetch=fetch) if photo_ref else None
+    if image:
+        st.image(image, use_container_width=True, caption=place.name)
     else:
-        return "Warm coat 🧥 and layers"
+        st.image(PLACEHOLDER_IMAGE, use_container_width=True)
 
-# --------------------------
-# Core Functions
-# --------------------------
+def show_detail_photos(photo_refs):
+    """Show the detail photos already stored; missing ones are fetched in the background for the next rerun."""
+    images = []
+    for photo_ref in photo_refs[:3]:
+        image = get_photo(photo_ref, fetch=False)
+        if image:
+            images.append(image)
+        else:
+            FETCH_SCHEDULER.submit(get_photo, photo_ref, priority=PRIORITY_LOW)
+    if images:
+        cols = st.columns(3)
+        for i, img in enumerate(images):
+            cols[i].image(img, use_container_width=True)
 
-def calculate_distance(user_lat, user_lng, place_lat, place_lng):
-    R = 6371  # Earth radius in km
-    lat_diff = radians(place_lat - user_lat)
-    lng_diff = radians(place_lng - user_lng)
-    a = (sin(lat_diff/2) ** 2 + cos(radians(user_lat)) *
-         cos(radians(place_lat)) * sin(lng_diff/2) ** 2)
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    return R * c
-
-def get_place_details(place_id):
-    if place_id in PLACE_DETAILS_CACHE:
-        return PLACE_DETAILS_CACHE[place_id]
-    
-    url = f"https://maps.googleapis.com/maps/api/place/details/json?place_id={place_id}&fields=name,formatted_address,website,formatted_phone_number,opening_hours,rating,reviews,photos&key={GOOGLE_PLACES_API_KEY}"
-    response = requests.get(url).json()
-    
-    if response.get("status") == "OK":
-        result = response["result"]
-        photos = [f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photoreference={p['photo_reference']}&key={GOOGLE_PLACES_API_KEY}"
-                 for p in result.get('photos', [])[:3]]
-        
-        details = {
-            "full_address": result.get("formatted_address", "N/A"),
-            "website": result.get("website", "N/A"),
-            "phone": result.get("formatted_phone_number", "N/A"),
-            "hours": "\n".join(result.get("opening_hours", {}).get("weekday_text", [])),
-            "photos": photos,
-            "reviews": result.get("reviews", [])
-        }
-        PLACE_DETAILS_CACHE[place_id] = details
-        return details
-    
-    return {}
+def cancel_prefetch(section=None):
+    """Cancel queued prefetches for one results section, or for all of them."""
+    prefetches = st.session_state.get("prefetch") or {}
+    for name in ([section] if section else list(prefetches)):
+        prefetch = prefetches.pop(name, None)
+        if prefetch:
+            # Fetches already running still finish and land in the shared cache
+            for future in prefetch["futures"].values():
+                future.cancel()
+    st.session_state.prefetch = prefetches
 
-@st.cache_data(ttl=3600, show_spinner=False)
-def get_nearby_places(location, place_types, radius=DEFAULT_RADIUS, min_rating=4.0):
-    user_lat, user_lng = map(float, location.split(','))
-    places = []
-    
-    def process_place_type(place_type):
-        params = {
-            "location": location,
-            "radius": radius,
-            "type": place_type,
-            "key": GOOGLE_PLACES_API_KEY,
-        }
-        try:
-            response = requests.get("https://maps.googleapis.com/maps/api/place/nearbysearch/json", params=params, timeout=10)
-            return response.json().get("results", [])
-        except:
-            return []
-    
-    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
-        results = list(executor.map(process_place_type, place_types))
-    
-    for place_type, results in zip(place_types, results):
-        for result in results:
-            place_rating = result.get("rating", 0)
-            if place_rating < min_rating:
-                continue
-            
-            place_coords = result["geometry"]["location"]
-            distance = calculate_distance(user_lat, user_lng, 
-                                         place_coords['lat'], place_coords['lng'])
-            
-            # Get first available photo
-            photo_url = None
-            if 'photos' in result:
-                photo_ref = result['photos'][0]['photo_reference']
-                photo_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photoreference={photo_ref}&key={GOOGLE_PLACES_API_KEY}"
-            
-            places.append({
-                "name": result["name"],
-                "type": place_type,
-                "rating": place_rating,
-                "distance": distance,
-                "coordinates": place_coords,
-                "place_id": result["place_id"],
-                "review_count": result.get("user_ratings_total", 0),
-                "photo_url": photo_url  # Added photo URL
-            })
+def prefetch_place_details(places, context, section):
+    """Queue low-priority details fetches for the top places so expanders open instantly.
+
+    ``context`` identifies what ``section`` currently shows (location, mood,
+    filters); when it changes, whatever is still queued for the previous
+    view of that section is cancelled.
+    """
+    prefetches = st.session_state.get("prefetch") or {}
+    prefetch = prefetches.get(section)
+    if prefetch and prefetch["context"] != context:
+        cancel_prefetch(section)
+        prefetches = st.session_state.prefetch
+        prefetch = None
+    if not prefetch:
+        prefetch = prefetches[section] = {"context": context, "futures": {}}
+        st.session_state.prefetch = prefetches
     
-    return sorted(places, key=lambda x: (-x['rating'], x['distance']))[:15]
+    for place in places[:PREFETCH_LIMIT]:
+        if place.place_id not in prefetch["futures"]:
+            prefetch["futures"][place.place_id] = FETCH_SCHEDULER.submit(
+                get_place_details, place.place_id, priority=PRIORITY_LOW
+            )
 
+def load_place_details(place_id):
+    """Details for a card, reusing an in-flight prefetch instead of fetching twice."""
+    prefetches = st.session_state.get("prefetch") or {}
+    future = next((p["futures"][place_id] for p in prefetches.values() if place_id in p["futures"]), None)
+    # A prefetch that hasn't started yet is cancelled and fetched directly at normal speed
+    if future is None or future.cancel():
+        return get_place_details(place_id)
+    return future.result()
+
+@metrics.timed("render_card", kind="preview")
+def display_place_preview(place):
+    """Widget-free card painted while results are still streaming in."""
+    with st.container():
+        show_card_image(place, fetch=False)
+        st.subheader(place.name)
+        st.caption(f"⭐ {place.rating} | 📍 {place.distance:.1f} km | 📝 {place.review_count} reviews")
+
+@metrics.timed("render_card", kind="mood")
 def display_place_card(place, key_suffix):
     with st.container():
         # Show main image from nearby search
-        if place.get('photo_url'):
-            st.image(place['photo_url'], use_container_width=True, caption=place['name'])
-        else:
-            st.image("https://via.placeholder.com/400x200?text=No+Preview", use_container_width=True)
+        show_card_image(place)
         
-        st.subheader(place['name'])
-        st.caption(f"⭐ {place['rating']} | 📍 {place['distance']:.1f} km | 📝 {place['review_count']} reviews")
+        st.subheader(place.name)
+        st.caption(f"⭐ {place.rating} | 📍 {place.distance:.1f} km | 📝 {place.review_count} reviews")
         
         # Show quick feedback badges
         feedback = generate_feedback(place, st.session_state.weather_data)
         if feedback:
             st.markdown(" ".join([f"`{f}`" for f in feedback[:2]]))
         
-        with st.expander("📌 Show Details", expanded=False):
-            if 'details' not in place:
-                with st.spinner("Loading details..."):
-                    place['details'] = get_place_details(place['place_id'])
-            
-            details = place['details']
+        # A collapsed expander still runs its body, so details load only once asked for,
+        # leaving the prefetch time to fill the shared details cache
+        if st.toggle("📌 Show Details", key=f"details_{key_suffix}"):
+            with st.spinner("Loading details..."):
+                details = load_place_details(place.place_id)
             
             # Show additional photos if available
             if details.get('photos'):
-                cols = st.columns(3)
-                for i, img in enumerate(details['photos'][:3]):
-                    cols[i].image(img, use_container_width=True)
+                show_detail_photos(details['photos'])
             
             # Display detailed information
             st.markdown(f"**Address:** {details['full_address']}")
@@ -194,8 +137,8 @@ def display_place_card(place, key_suffix):
             
             if st.button("🗺️ Show on Map", key=f"map_{key_suffix}"):
                 map_data = pd.DataFrame({
-                    "lat": [place['coordinates']['lat']],
-                    "lon": [place['coordinates']['lng']]
+                    "lat": [place.lat],
+                    "lon": [place.lng]
                 })
                 st.map(map_data, zoom=14, use_container_width=True)
             
@@ -209,81 +152,28 @@ def display_place_card(place, key_suffix):
                     st.markdown(f"_{review['text']}_")
                     st.caption(f"— {review['author_name']}")
 
-@st.cache_data(ttl=3600)
-def get_popular_places(location, radius=DEFAULT_RADIUS):
-    user_lat, user_lng = map(float, location.split(','))
-    places = []
-    
-    for category in POPULAR_CATEGORIES:
-        params = {
-            "location": location,
-            "radius": radius,
-            "type": category,
-            "key": GOOGLE_PLACES_API_KEY,
-            "rankby": "prominence"
-        }
-        
-        try:
-            response = requests.get("https://maps.googleapis.com/maps/api/place/nearbysearch/json", params=params, timeout=10)
-            results = response.json().get("results", [])
-        except:
-            results = []
-        
-        for result in results:
-            if result.get("user_ratings_total", 0) < 100:
-                continue
-            
-            place_coords = result["geometry"]["location"]
-            distance = calculate_distance(user_lat, user_lng,
-                                         place_coords['lat'], place_coords['lng'])
-            
-            # Get first available photo
-            photo_url = None
-            if 'photos' in result and result['photos']:
-                photo_ref = result['photos'][0]['photo_reference']
-                photo_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photoreference={photo_ref}&key={GOOGLE_PLACES_API_KEY}"
-            
-            places.append({
-                "name": result["name"],
-                "rating": result.get("rating", 0),
-                "distance": distance,
-                "review_count": result.get("user_ratings_total", 0),
-                "coordinates": place_coords,
-                "place_id": result["place_id"],
-                "type": category,
-                "photo_url": photo_url  # Added photo URL
-            })
-    
-    return sorted(places, key=lambda x: (-x['rating'], -x['review_count']))[:10]
-
+@metrics.timed("render_card", kind="popular")
 def display_popular_place(place, key_suffix):
     """Special display function for popular places with image outside card"""
     # Display image outside the container
-    if place.get('photo_url'):
-        st.image(place['photo_url'], use_container_width=True, caption=place['name'])
-    else:
-        st.image("https://via.placeholder.com/400x200?text=No+Preview", use_container_width=True)
+    show_card_image(place)
     
     # Card container
     with st.container():
-        st.subheader(place['name'])
-        st.caption(f"⭐ {place['rating']} | 📍 {place['distance']:.1f} km | 📝 {place['review_count']} reviews")
+        st.subheader(place.name)
+        st.caption(f"⭐ {place.rating} | 📍 {place.distance:.1f} km | 📝 {place.review_count} reviews")
         
         feedback = generate_feedback(place, st.session_state.weather_data)
         if feedback:
             st.markdown(" ".join([f"`{f}`" for f in feedback[:2]]))
         
-        with st.expander("📌 Show Details", expanded=False):
-            if 'details' not in place:
-                with st.spinner("Loading details..."):
-                    place['details'] = get_place_details(place['place_id'])
-            
-            details = place['details']
+        # Not an expander: see display_place_card
+        if st.toggle("📌 Show Details", key=f"details_pop_{key_suffix}"):
+            with st.spinner("Loading details..."):
+                details = load_place_details(place.place_id)
             
             if details.get('photos'):
-                cols = st.columns(3)
-                for i, img in enumerate(details['photos'][:3]):
-                    cols[i].image(img, use_container_width=True)
+                show_detail_photos(details['photos'])
             
             st.markdown(f"**Address:** {details['full_address']}")
             if details['website'] != "N/A":
@@ -291,8 +181,8 @@ def display_popular_place(place, key_suffix):
             
             if st.button("🗺️ Show on Map", key=f"map_pop_{key_suffix}"):
                 map_data = pd.DataFrame({
-                    "lat": [place['coordinates']['lat']],
-                    "lon": [place['coordinates']['lng']]
+                    "lat": [place.lat],
+                    "lon": [place.lng]
                 })
                 st.map(map_data, zoom=14, use_container_width=True)
             
@@ -307,22 +197,45 @@ def display_popular_place(place, key_suffix):
                     st.caption(f"— {review['author_name']}")
 
         if st.button("❤️ Save to Favorites", key=f"fav_pop_{key_suffix}"):
-            st.session_state.favorites.append(place)
-            st.success("Added to favorites!")
+            save_favorite(place)
+
+# --------------------------
+# Favorites
+# --------------------------
+
+def current_user_id():
+    """Anonymous id for this browser, kept in the page URL so favorites survive reloads."""
+    if "user_id" not in st.session_state:
+        user_id = st.query_params.get("user", "")
+        if not re.fullmatch(r"[0-9a-f]{32}", user_id):
+            user_id = uuid.uuid4().hex
+            st.query_params["user"] = user_id
+        st.session_state.user_id = user_id
+    return st.session_state.user_id
+
+def save_favorite(place):
+    # Saves happen inside card fragments and only rerun the card; the sidebar list catches up
+    # on its refresh button or the next full rerun
+    if FAVORITES.add(current_user_id(), place.place_id, place.name):
+        st.toast("Added to favorites!", icon="❤️")
+    else:
+        st.info("Already in your favorites")
 
 # --------------------------
 # UI Components
 # --------------------------
 
 
+def set_mood(mood):
+    st.session_state.selected_mood = mood
+
 def mood_selector():
     st.subheader("🎭 Select Your Mood")
     selected_mood = st.session_state.get("selected_mood", "")
     
+    # Buttons update the mood in callbacks, so the surrounding fragment's own rerun picks it up
     if selected_mood:
-        if st.button("❌ Clear Mood Selection"):
-            st.session_state.selected_mood = ""
-            st.rerun()
+        st.button("❌ Clear Mood Selection", on_click=set_mood, args=("",))
     
     moods = list(MOOD_ACTIVITIES.keys())
     cols = st.columns(4)
@@ -331,72 +244,248 @@ def mood_selector():
         with cols[i%4]:
             btn_type = "primary" if mood == selected_mood else "secondary"
             label = f"⭐ {mood.upper()}" if mood == selected_mood else mood.upper()
-            
-            if st.button(label, key=f"mood_{i}", help=f"Find {mood} activities", type=btn_type):
-                st.session_state.selected_mood = mood
-                st.rerun()
+            st.button(label, key=f"mood_{i}", help=f"Find {mood} activities", type=btn_type,
+                      on_click=set_mood, args=(mood,))
     
     return selected_mood
 
-def generate_feedback(place, weather_data):
-    feedback = []
-    
-    
-    distance = place.get('distance', 0)
-    if distance < 1.0:
-        feedback.append("🚶 Conveniently located nearby")
-    elif distance < 3.0:
-        feedback.append("📍 Just a short trip away")
-    
-    if weather_data:
-        weather_condition = weather_data.get('main', '').lower()
-        temp = weather_data.get('temp', 20)
-        place_type = place.get('type', '')
-        
-        if place_type in ['park', 'beach', 'botanical_garden', 'nature']:
-            if 'rain' not in weather_condition and temp > 15:
-                feedback.append("🌤️ Perfect for enjoying the nice weather")
-            elif 'rain' in weather_condition:
-                feedback.append("☔ Beautiful even in rain - bring an umbrella!")
-        elif place_type in ['museum', 'art_gallery', 'cultural_center']:
-            if 'rain' in weather_condition or temp < 15:
-                feedback.append("🏛️ Great indoor activity for today's weather")
-            else:
-                feedback.append("❄️ Cool escape from the heat")
-    
-    type_feedback = {
-        'spa': "💆 Relaxing ambience perfect for unwinding",
-        'amusement_park': "🎢 Exciting rides and fun atmosphere",
-        'restaurant': "🍽️ Known for delicious cuisine and great service",
-        'museum': "🎨 Rich in culture and history",
-        'park': "🌳 Peaceful natural surroundings",
-        'shopping_mall': "🛍️ Great variety of stores and amenities",
-        'tourist_attraction': "📸 Must-see spot in the area",
-        'landmark': "🏰 Iconic historical location",
-        'art_gallery': "🖼️ Explore beautiful artworks",
-        'zoo': "🐅 Family-friendly wildlife experience",
-        'church': "⛪ Architectural beauty and serenity",
-        'beach': "🏖️ Sandy shores and ocean views",
-        'hiking_trail': "🥾 Adventure with scenic trails",
-        'library': "📚 Quiet space for peaceful time"
-    }
-    place_type = place.get('type', '')
-    feedback.append(type_feedback.get(place_type, "🌟 Great choice for your current mood"))
+# --------------------------
+# Instrumentation
+# --------------------------
+
+def traced(section):
+    """Keep the spans and upstream calls of the latest run of ``section`` for the debug panel."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with metrics.trace() as trace:
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    trace["elapsed"] = time.time() - trace["started"]
+                    traces = st.session_state.get("traces") or {}
+                    traces[section] = trace
+                    st.session_state.traces = traces
+        return wrapper
+    return decorate
+
+@st.fragment
+def debug_panel():
+    """Where the latest runs spent their time and quota, plus process-wide cache figures."""
+    st.subheader("🛠️ Debug")
+    st.button("🔄 Refresh", key="debug_refresh", help="Show runs made since this panel was drawn")
+    traces = st.session_state.get("traces") or {}
+    for section in ("page", "mood", "popular", "itinerary"):
+        trace = traces.get(section)
+        if not trace:
+            continue
+        calls = {}
+        for (name, labels), value in trace["counters"].items():
+            if name == "upstream_requests_total":
+                endpoint = dict(labels)["endpoint"]
+                calls[endpoint] = calls.get(endpoint, 0) + value
+        st.markdown(f"**Last {section} run:** {trace['elapsed'] * 1000:.0f} ms, "
+                    f"{sum(calls.values())} upstream calls")
+        if calls:
+            st.caption(" | ".join(f"{endpoint}: {count}" for endpoint, count in sorted(calls.items())))
+        if trace["spans"]:
+            spans = pd.DataFrame([(name, seconds * 1000) for name, _, seconds in trace["spans"]],
+                                 columns=["span", "ms"])
+            summary = spans.groupby("span")["ms"].agg(["count", "sum", "max"]).round(1)
+            st.dataframe(summary.sort_values("sum", ascending=False), use_container_width=True)
     
-    return feedback[:3]
+    st.markdown("**Caches (this process)**")
+    lines = []
+    for name, cache in sorted(all_caches().items()):
+        stats = cache.stats
+        hits = stats["hits"] + stats["negative_hits"] + stats["stale_hits"]
+        lookups = hits + stats["misses"]
+        if lookups:
+            lines.append(f"{name}: {hits / lookups:.0%} of {lookups}")
+    index_lookups = PLACE_INDEX.stats["hits"] + PLACE_INDEX.stats["misses"]
+    if index_lookups:
+        lines.append(f"place_index: {PLACE_INDEX.stats['hits'] / index_lookups:.0%} of {index_lookups}")
+    st.caption(" | ".join(lines) or "No lookups yet")
+    failures = sum(v for (name, _), v in metrics.counters().items() if name == "failures_total")
+    st.caption(f"Failed fetches since start: {failures}")
 
 # --------------------------
 # Main App
 # --------------------------
 
+@st.fragment(run_every=WEATHER_REFRESH_INTERVAL)
+def weather_panel(gps_coords, detected_city):
+    """Weather for the current location; refreshes on its own without rerunning the app."""
+    try:
+        if gps_coords:
+            weather_data = get_weather(lat=gps_coords[0], lng=gps_coords[1])
+        else:
+            weather_data = get_weather(detected_city)
+        if weather_data:
+            cols = st.columns(4)
+            cols[0].subheader(f"⛅ {detected_city.capitalize()} Weather")
+            cols[0].markdown(f"**Temp:** {weather_data['temp']}°C | **Feels Like:** {weather_data['feels_like']}°C")
+            cols[1].markdown(f"**Humidity:** {weather_data['humidity']}% | **Condition:** {weather_data['main']}")
+            cols[2].markdown(f"**Clothing:** {get_clothing_advice(weather_data['temp'])}")
+            st.session_state.weather_data = weather_data
+    except Exception as exc:
+        metrics.inc("failures_total", operation="weather_panel", error=type(exc).__name__)
+
+@st.fragment
+def favorites_panel():
+    """Sidebar favorites list; redrawn on full reruns or its refresh button, never polled."""
+    st.subheader("❤️ Favorites")
+    st.button("🔄 Refresh", key="favorites_refresh", help="Show places saved since this list was drawn")
+    user_id = current_user_id()
+    favorites = FAVORITES.list(user_id)
+    if not favorites:
+        st.markdown("No favorites saved yet")
+        return
+    for i, (place_id, name) in enumerate(favorites):
+        name_col, remove_col = st.columns([5, 1])
+        name_col.markdown(f"{i+1}. {name or place_id}")
+        if remove_col.button("✖", key=f"unfav_{place_id}", help="Remove from favorites"):
+            FAVORITES.remove(user_id, place_id)
+            st.rerun(scope="fragment")
+
+@st.fragment
+def mood_place_card(place, i):
+    """One mood result; its buttons only rerun this card."""
+    display_place_card(place, f"mood_{i}")
+    if st.button("❤️ Save to Favorites", key=f"fav_{i}"):
+        save_favorite(place)
+
+@st.fragment
+def popular_place_card(place, i):
+    """One popular place; its buttons only rerun this card."""
+    display_popular_place(place, f"popular_{i}")
+    if st.button("❤️", key=f"heart_{i}"):
+        save_favorite(place)
+
+@st.fragment
+@traced("mood")
+def mood_section(current_loc, search_radius, min_rating, prefetch_enabled):
+    """Mood buttons and their results grid; picking a mood reruns only this section."""
+    selected_mood = mood_selector()
+    if not (current_loc and selected_mood):
+        cancel_prefetch("mood")
+        st.session_state.mood_place_ids = []
+        return
+    
+    prefetch_context = (current_loc, selected_mood, search_radius, min_rating)
+    grid = st.empty()
+    places = []
+    with st.spinner("🔍 Finding best matches..."):
+        # Paint preview cards as each category arrives, then swap in the full cards
+        for places in stream_nearby_places(
+            current_loc,
+            MOOD_ACTIVITIES[selected_mood],
+            radius=search_radius*1000,
+            min_rating=min_rating
+        ):
+            if places:
+                with grid.container():
+                    st.header(f"🏆 Top {selected_mood.capitalize()} Recommendations")
+                    cols = st.columns(3)
+                    for i, place in enumerate(places):
+                        with cols[i%3]:
+                            display_place_preview(place)
+        
+        if prefetch_enabled:
+            prefetch_place_details(places, prefetch_context, "mood")
+        # Only ids are kept, for the day planner
+        st.session_state.mood_place_ids = [place.place_id for place in places]
+        
+        if places:
+            warm_card_photos(places, priority=PRIORITY_HIGH)
+            with grid.container():
+                st.header(f"🏆 Top {selected_mood.capitalize()} Recommendations")
+                cols = st.columns(3)
+                for i, place in enumerate(places):
+                    with cols[i%3]:
+                        mood_place_card(place, i)
+
+@st.fragment
+@traced("popular")
+def popular_section(current_loc, prefetch_enabled):
+    st.header("🌟 Must-Visit Popular Places")
+    with st.spinner("Finding top attractions..."):
+        places = get_popular_places(current_loc)
+        if prefetch_enabled:
+            prefetch_place_details(places, (current_loc,), "popular")
+        if places:
+            warm_card_photos(places)
+            cols = st.columns(3)
+            for i, place in enumerate(places):
+                with cols[i%3]:
+                    popular_place_card(place, i)
+
+def format_clock(minute, start_minute):
+    """Clock time of a minute of the week, marked with the days after the plan's start."""
+    days = int(minute // MINUTES_PER_DAY - start_minute // MINUTES_PER_DAY)
+    label = f"{int(minute % MINUTES_PER_DAY) // 60:02d}:{int(minute % 60):02d}"
+    return f"{label} (+{days}d)" if days else label
+
+WEEKDAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+def user_weekday():
+    """Today's weekday in the user's browser timezone, 0 being Sunday as in opening hours."""
+    # Streamlit before 1.43 doesn't report the browser timezone; the server's date is used then
+    offset = getattr(st.context, "timezone_offset", None)
+    if offset is None:
+        today = datetime.date.today()
+    else:
+        # Minutes behind UTC, as JavaScript reports them
+        today = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=offset)).date()
+    return (today.weekday() + 1) % 7
+
+@st.fragment
+@traced("itinerary")
+def itinerary_panel(current_loc):
+    """Order saved places, and optionally the current mood results, into a route for the day."""
+    with st.expander("🗓️ Plan My Day", expanded=False):
+        favorite_ids = [place_id for place_id, _ in FAVORITES.list(current_user_id())]
+        mood_ids = st.session_state.get("mood_place_ids") or []
+        cols = st.columns(5)
+        mode = cols[0].radio("Travel", list(TRAVEL_SPEEDS), horizontal=True)
+        day = cols[1].selectbox("Day", range(len(WEEKDAYS)), index=user_weekday(), format_func=WEEKDAYS.__getitem__)
+        start_time = cols[2].time_input("Start at", value=datetime.time(9, 0))
+        visit_minutes = cols[3].slider("Minutes per stop", 15, 180, VISIT_MINUTES, 15)
+        include_mood = cols[4].checkbox("Add mood results", value=not favorite_ids, disabled=not mood_ids)
+        place_ids = list(dict.fromkeys(favorite_ids + (mood_ids if include_mood else [])))
+        if not place_ids:
+            st.markdown("Save favorites or pick a mood to plan a route")
+            return
+        if not st.button(f"🗺️ Plan a route ({len(place_ids)} places)"):
+            return
+        
+        # Opening hours are weekly, starting on Sunday
+        start_minute = day * MINUTES_PER_DAY + start_time.hour * 60 + start_time.minute
+        with st.spinner("Planning your day..."):
+            plan = plan_itinerary(place_ids, current_loc, start_minute=start_minute, mode=mode,
+                                  visit_minutes=visit_minutes)
+        if plan["stops"]:
+            st.markdown(f"**Stops: {len(plan['stops'])} | {plan['distance_km']:.1f} km {mode} | "
+                        f"done by {format_clock(plan['finish'], start_minute)}**")
+            st.dataframe(pd.DataFrame({
+                "Place": [stop["name"] for stop in plan["stops"]],
+                "Arrive": [format_clock(stop["arrival"], start_minute) for stop in plan["stops"]],
+                "Start": [format_clock(stop["start"], start_minute) for stop in plan["stops"]],
+                "Leg (km)": [round(stop["leg_km"], 2) for stop in plan["stops"]],
+            }, index=range(1, len(plan["stops"]) + 1)), use_container_width=True)
+            st.map(pd.DataFrame({"lat": [stop["lat"] for stop in plan["stops"]],
+                                 "lon": [stop["lng"] for stop in plan["stops"]]}), use_container_width=True)
+        if plan["unscheduled"]:
+            names = [get_place_details(place_id).get("name") or place_id for place_id in plan["unscheduled"]]
+            st.caption("Left out (closed at that time or no location): " + ", ".join(names))
+
+@traced("page")
 def main():
     
     st.set_page_config(page_title="Smart City Explorer", page_icon="🌇", layout="wide")
     
     if 'selected_mood' not in st.session_state:
         st.session_state.selected_mood = ""
-    if 'favorites' not in st.session_state:
-        st.session_state.favorites = []
     if 'weather_data' not in st.session_state:
         st.session_state.weather_data = None
 
@@ -404,45 +493,31 @@ def main():
     
     # Location Section
     current_loc = None
+    gps_coords = None
     detected_city = "your area"
     
     with st.expander("📍 SET YOUR LOCATION", expanded=True):
         loc_col1, loc_col2 = st.columns([2,1])
         with loc_col1:
-            location = streamlit_geolocation()
+            with metrics.span("geolocation"):
+                location = streamlit_geolocation()
             if location and location.get("latitude"):
                 current_loc = f"{location['latitude']},{location['longitude']}"
+                gps_coords = (location['latitude'], location['longitude'])
                 st.success("📍 Location detected automatically!")
         
         with loc_col2:
             city = st.text_input("Or Enter City Name")
             if city:
-                try:
-                    geocode_url = f"https://maps.googleapis.com/maps/api/geocode/json?address={city}&key={GOOGLE_PLACES_API_KEY}"
-                    response = requests.get(geocode_url, timeout=10)
-                    if response.json().get("status") == "OK":
-                        location = response.json()["results"][0]["geometry"]["location"]
-                        current_loc = f"{location['lat']},{location['lng']}"
-                        detected_city = city
-                except:
-                    pass
+                city_loc = geocode_city(city)
+                if city_loc:
+                    current_loc = city_loc
+                    gps_coords = None
+                    detected_city = city
 
     # Weather Section
     if current_loc:
-        try:
-            weather_data = get_weather(detected_city) if detected_city else None
-            if weather_data:
-                cols = st.columns(4)
-                cols[0].subheader(f"⛅ {detected_city.capitalize()} Weather")
-                cols[0].markdown(f"**Temp:** {weather_data['temp']}°C | **Feels Like:** {weather_data['feels_like']}°C")
-                cols[1].markdown(f"**Humidity:** {weather_data['humidity']}% | **Condition:** {weather_data['main']}")
-                cols[2].markdown(f"**Clothing:** {get_clothing_advice(weather_data['temp'])}")
-                st.session_state.weather_data = weather_data
-        except:
-            pass
-
-    # Mood Selection
-    selected_mood = mood_selector()
+        weather_panel(gps_coords, detected_city)
 
     # Sidebar Controls
     with st.sidebar:
@@ -451,48 +526,29 @@ def main():
         search_radius = st.select_slider("Search Radius (km)", options=[1, 2, 5, 10, 20], value=5)
         st.session_state.min_rating = min_rating
         st.session_state.search_radius = search_radius
+        prefetch_enabled = st.checkbox("⚡ Prefetch place details", value=False,
+                                       help="Load details for the top results in the background")
         
         st.markdown("---")
-        st.subheader("❤️ Favorites")
-        if st.session_state.favorites:
-            for i, fav in enumerate(st.session_state.favorites):
-                st.markdown(f"{i+1}. {fav['name']}")
-        else:
-            st.markdown("No favorites saved yet")
+        favorites_panel()
+        
+        st.markdown("---")
+        if st.checkbox("🛠️ Show debug panel", value=False):
+            debug_panel()
 
     # Main Content
+    if not (current_loc and prefetch_enabled):
+        cancel_prefetch()
+    
+    # Mood Selection and Results
+    mood_section(current_loc, search_radius, min_rating, prefetch_enabled)
+    
+    # Day Planner
+    itinerary_panel(current_loc)
+
+    # Popular Places
     if current_loc:
-        if selected_mood:
-            with st.spinner("🔍 Finding best matches..."):
-                places = get_nearby_places(
-                    current_loc,
-                    MOOD_ACTIVITIES[selected_mood],
-                    radius=st.session_state.search_radius*1000,
-                    min_rating=st.session_state.min_rating
-                )
-                
-                if places:
-                    st.header(f"🏆 Top {selected_mood.capitalize()} Recommendations")
-                    cols = st.columns(3)
-                    for i, place in enumerate(places):
-                        with cols[i%3]:
-                            display_place_card(place, f"mood_{i}")
-                            if st.button("❤️ Save to Favorites", key=f"fav_{i}"):
-                                st.session_state.favorites.append(place)
-                                st.success("Added to favorites!")
-
-        # Popular Places
-        st.header("🌟 Must-Visit Popular Places")
-        with st.spinner("Finding top attractions..."):
-            places = get_popular_places(current_loc)
-            if places:
-                cols = st.columns(3)
-                for i, place in enumerate(places):
-                    with cols[i%3]:
-                        display_popular_place(place, f"popular_{i}")
-                        if st.button("❤️", key=f"heart_{i}"):
-                            st.session_state.favorites.append(place)
-                            st.success("Added to favorites!")
+        popular_section(current_loc, prefetch_enabled)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
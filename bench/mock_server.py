@@ -0,0 +1,271 @@
+"""Local stand-in for the Places (including photos), Geocoding and OpenWeatherMap endpoints.
+
+Responses come from recorded JSON files when a recordings directory is
+given, and are otherwise synthesized deterministically from the request, so
+repeated runs see the same places. Latency and error rates are configurable.
+
+    python -m bench.mock_server --port 8765 --latency-ms 120 --error-rate 0.02
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ENDPOINTS = {
+    "/maps/api/place/nearbysearch/json": "nearbysearch",
+    "/maps/api/place/details/json": "details",
+    "/maps/api/geocode/json": "geocode",
+    "/maps/api/place/photo": "photo",
+    "/data/2.5/weather": "weather",
+}
+
+PAGE_SIZE = 20
+MAX_PAGES = 3
+# Place ids come from a shared pool so the same place shows up under several types
+PLACE_POOL_SIZE = 150
+
+
+def _rng(*parts):
+    seed = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()
+    return random.Random(int(seed[:16], 16))
+
+
+def _cell(location):
+    lat, lng = map(float, location.split(","))
+    return f"{lat:.2f},{lng:.2f}"
+
+
+def _place(place_id, lat, lng, rng):
+    return {
+        "name": f"Mock Place {place_id.rsplit('-', 1)[-1]}",
+        "place_id": place_id,
+        "rating": round(rng.uniform(3.0, 5.0), 1),
+        "user_ratings_total": rng.randint(0, 5000),
+        "geometry": {"location": {"lat": lat + rng.uniform(-0.03, 0.03),
+                                  "lng": lng + rng.uniform(-0.03, 0.03)}},
+        "photos": [{"photo_reference": f"photo-{place_id}"}],
+    }
+
+
+def synth_nearbysearch(params):
+    token = params.get("pagetoken")
+    if token:
+        location, place_type, page = token.split("|")
+        page = int(page)
+    else:
+        location, place_type, page = params.get("location", "0,0"), params.get("type", ""), 0
+    lat, lng = map(float, location.split(","))
+    cell = _cell(location)
+    results = []
+    for i in range(PAGE_SIZE):
+        rng = _rng(cell, place_type, page, i)
+        # No commas, like real place ids, so lists of them can be comma-separated
+        place_id = f"mock-{cell.replace(',', '_')}-{rng.randrange(PLACE_POOL_SIZE)}"
+        results.append(_place(place_id, lat, lng, _rng(place_id)))
+    body = {"status": "OK", "results": results}
+    if page + 1 < MAX_PAGES:
+        body["next_page_token"] = f"{location}|{place_type}|{page + 1}"
+    return body
+
+
+def _periods(rng):
+    """Opening periods in the Places API shape: mostly daytime, some late, some around the clock."""
+    kind = rng.random()
+    if kind < 0.15:
+        return [{"open": {"day": 0, "time": "0000"}}]
+    opens, closes = ("1800", "0200") if kind < 0.3 else (rng.choice(["0800", "0900", "1000"]), rng.choice(["1700", "1800", "2000"]))
+    closed_day = rng.randrange(7) if rng.random() < 0.3 else None
+    return [{"open": {"day": day, "time": opens},
+             "close": {"day": day if closes > opens else (day + 1) % 7, "time": closes}}
+            for day in range(7) if day != closed_day]
+
+
+def synth_details(params):
+    place_id = params.get("place_id", "")
+    rng = _rng(place_id)
+    # Within the grid cell the place id was drawn for, like its nearby search results
+    try:
+        lat, lng = map(float, place_id[len("mock-"):].rsplit("-", 1)[0].split("_"))
+        location = _place(place_id, lat, lng, _rng(place_id))["geometry"]["location"]
+    except (IndexError, ValueError):
+        location = {"lat": 0.0, "lng": 0.0}
+    return {"status": "OK", "result": {
+        "name": f"Mock Place {place_id.rsplit('-', 1)[-1]}",
+        "geometry": {"location": location},
+        "formatted_address": f"{rng.randint(1, 200)} Mock Street",
+        "website": "https://example.com",
+        "formatted_phone_number": "+1 555 0100",
+        "opening_hours": {"periods": _periods(_rng(place_id, "hours")),
+                          "weekday_text": [f"{day}: 9:00 AM – 6:00 PM" for day in
+                                           ("Monday", "Tuesday", "Wednesday", "Thursday",
+                                            "Friday", "Saturday", "Sunday")]},
+        "rating": round(rng.uniform(3.0, 5.0), 1),
+        "reviews": [{"author_name": f"Reviewer {i}", "text": "Lovely spot."} for i in range(3)],
+        "photos": [{"photo_reference": f"photo-{place_id}-{i}"} for i in range(3)],
+    }}
+
+
+def synth_geocode(params):
+    rng = _rng(params.get("address", "").lower())
+    return {"status": "OK", "results": [{"geometry": {"location": {
+        "lat": round(rng.uniform(-60, 60), 4), "lng": round(rng.uniform(-170, 170), 4)}}}]}
+
+
+def synth_weather(params):
+    rng = _rng(params.get("q"), params.get("lat"), params.get("lon"))
+    temp = round(rng.uniform(-5, 35), 1)
+    return {"cod": 200, "main": {"temp": temp, "feels_like": temp - 1, "humidity": rng.randint(20, 95)},
+            "weather": [{"main": rng.choice(["Clear", "Clouds", "Rain"])}]}
+
+
+def synth_photo(params):
+    from PIL import Image
+    rng = _rng(params.get("photoreference"))
+    width = int(params.get("maxwidth", 400))
+    color = tuple(rng.randrange(256) for _ in range(3))
+    out = io.BytesIO()
+    Image.new("RGB", (width, width * 2 // 3), color).save(out, format="JPEG")
+    return out.getvalue()
+
+
+SYNTHESIZERS = {
+    "nearbysearch": synth_nearbysearch,
+    "details": synth_details,
+    "geocode": synth_geocode,
+    "weather": synth_weather,
+    "photo": synth_photo,
+}
+
+
+class MockServer:
+    """Threaded mock upstream server with per-endpoint request counters."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0, jitter_ms=0,
+                 error_rate=0.0, quota_error_rate=0.0, recordings_dir=None, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.quota_error_rate = quota_error_rate
+        self.recordings = self._load_recordings(recordings_dir)
+        self.counts = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @staticmethod
+    def _load_recordings(recordings_dir):
+        """Load ``<endpoint>.json`` files, each a list of responses or a single response."""
+        recordings = {}
+        if not recordings_dir:
+            return recordings
+        for endpoint in SYNTHESIZERS:
+            if endpoint == "photo":
+                continue
+            path = os.path.join(recordings_dir, f"{endpoint}.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    data = json.load(f)
+                recordings[endpoint] = data if isinstance(data, list) else [data]
+        return recordings
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def snapshot(self):
+        with self._lock:
+            return Counter(self.counts)
+
+    def _respond(self, endpoint, params):
+        with self._lock:
+            self.counts[endpoint] += 1
+            self.counts["total"] += 1
+            roll = self._rng.random()
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            recorded = self.recordings.get(endpoint)
+            recording = recorded[self.counts[endpoint] % len(recorded)] if recorded else None
+        time.sleep(delay)
+        if roll < self.error_rate:
+            with self._lock:
+                self.counts["errors"] += 1
+            return 503, {"error": "mock upstream failure"}
+        if endpoint not in ("weather", "photo") and roll < self.error_rate + self.quota_error_rate:
+            with self._lock:
+                self.counts["errors"] += 1
+            return 200, {"status": "OVER_QUERY_LIMIT", "results": []}
+        if recording is not None:
+            return 200, recording
+        return 200, SYNTHESIZERS[endpoint](params)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                endpoint = ENDPOINTS.get(parsed.path)
+                if endpoint is None:
+                    status, body = 404, {"error": "unknown endpoint"}
+                else:
+                    params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                    status, body = server._respond(endpoint, params)
+                if isinstance(body, bytes):
+                    payload, content_type = body, "image/jpeg"
+                else:
+                    payload, content_type = json.dumps(body).encode(), "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=30)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--quota-error-rate", type=float, default=0.0)
+    parser.add_argument("--recordings", help="directory of recorded <endpoint>.json responses")
+    args = parser.parse_args()
+
+    server = MockServer(args.host, args.port, args.latency_ms, args.jitter_ms,
+                        args.error_rate, args.quota_error_rate, args.recordings)
+    print(f"Mock upstream listening on {server.url}")
+    print(f"  GOOGLE_MAPS_BASE_URL={server.url} OPENWEATHERMAP_BASE_URL={server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
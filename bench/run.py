@@ -0,0 +1,234 @@
+"""Offline benchmark for Smart City Explorer against the local mock upstream.
+
+Runs scripted fetches and full app reruns (through Streamlit's AppTest) and
+reports wall time, upstream calls per interaction, cache hit rates and peak
+memory for each scenario.
+
+    python -m bench.run --latency-ms 120 --json bench_output.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+from bench.mock_server import MockServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+LOCATIONS = ["48.8566,2.3522", "40.7128,-74.0060", "35.6762,139.6503"]
+CITIES = ["Paris", "New York", "Tokyo"]
+ITINERARY_START = 9 * 60  # Sunday 09:00
+ITINERARY_VISIT_MINUTES = 5  # short stops, so 100+ of them can fit the opening hours
+RADIUS_SWEEP = [20000, 10000, 5000, 2000]  # meters, the app's radius slider stops
+RADIUS_JUMP = [20000, 5000]  # meters, the slider dragged from its widest stop straight to the default
+
+
+def configure_environment(server, args):
+    """Point the engine at the mock server and a throwaway cache before it is imported."""
+    os.environ["GOOGLE_MAPS_BASE_URL"] = server.url
+    os.environ["OPENWEATHERMAP_BASE_URL"] = server.url
+    os.environ["GOOGLE_PLACES_API_KEY"] = "bench-key"
+    os.environ["OPENWEATHERMAP_API_KEY"] = "bench-key"
+    cache_dir = tempfile.mkdtemp(prefix="sce-bench-")
+    os.environ["CACHE_DB_PATH"] = os.path.join(cache_dir, "cache.sqlite3")
+    os.environ["PHOTO_CACHE_DIR"] = os.path.join(cache_dir, "photos")
+    os.environ["FAVORITES_DB_PATH"] = os.path.join(cache_dir, "favorites.sqlite3")
+    os.environ["PAGE_TOKEN_DELAY"] = str(args.page_token_delay)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+
+def cache_counters():
+    import engine
+    from cache import all_caches
+    counters = {name: dict(c.stats) for name, c in all_caches().items()}
+    counters["place_index"] = dict(engine.PLACE_INDEX.stats)
+    return counters
+
+
+def clear_caches():
+    import streamlit as st
+    import engine
+    from cache import all_caches
+    st.cache_data.clear()
+    for c in all_caches().values():
+        c.clear()
+    engine.PLACE_INDEX.clear()
+
+
+def hit_rates(before, after):
+    rates = {}
+    for name, stats in after.items():
+        base = before.get(name, {})
+        hits = sum(stats.get(k, 0) - base.get(k, 0) for k in ("hits", "negative_hits", "stale_hits"))
+        misses = stats["misses"] - base.get("misses", 0)
+        if hits + misses:
+            rates[name] = round(hits / (hits + misses), 3)
+    return rates
+
+
+def run_scenario(server, name, interactions):
+    """Time each interaction and collect the deltas it caused."""
+    calls_before = server.snapshot()
+    caches_before = cache_counters()
+    tracemalloc.start()
+    timings = []
+    for interaction in interactions:
+        start = time.perf_counter()
+        interaction()
+        timings.append((time.perf_counter() - start) * 1000)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    calls = server.snapshot() - calls_before
+    n = len(interactions)
+    return {
+        "scenario": name,
+        "interactions": n,
+        "wall_ms_total": round(sum(timings), 1),
+        "wall_ms_median": round(statistics.median(timings), 1),
+        "wall_ms_p95": round(sorted(timings)[max(0, int(round(0.95 * n)) - 1)], 1),
+        "upstream_calls": dict(calls),
+        "upstream_calls_per_interaction": round(calls["total"] / n, 2),
+        "cache_hit_rates": hit_rates(caches_before, cache_counters()),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def fetch_scenarios(engine, moods):
+    def nearby():
+        return [lambda loc=loc, mood=mood: engine.get_nearby_places(
+                    loc, engine.MOOD_ACTIVITIES[mood], radius=engine.DEFAULT_RADIUS, min_rating=4.0)
+                for loc in LOCATIONS for mood in moods]
+
+    def popular():
+        return [lambda loc=loc: engine.get_popular_places(loc) for loc in LOCATIONS]
+
+    def radius_sweep():
+        # Widest first, as when a user zooms the radius slider in
+        return [lambda loc=loc, radius=radius: engine.get_nearby_places(
+                    loc, engine.MOOD_ACTIVITIES[moods[0]], radius=radius, min_rating=4.0)
+                for loc in LOCATIONS for radius in RADIUS_SWEEP]
+
+    def radius_jump():
+        # The narrower search should come from the place index, never upstream
+        return [lambda loc=loc, radius=radius: engine.get_nearby_places(
+                    loc, engine.MOOD_ACTIVITIES[moods[0]], radius=radius, min_rating=4.0)
+                for loc in LOCATIONS for radius in RADIUS_JUMP]
+
+    def details():
+        place_ids = [p.place_id for loc in LOCATIONS
+                     for p in engine.get_popular_places(loc) + engine.get_nearby_places(loc, engine.MOOD_ACTIVITIES[moods[0]])]
+        return [lambda pid=pid: engine.get_place_details(pid) for pid in dict.fromkeys(place_ids)]
+
+    def itinerary():
+        # Every place the mood searches return around each location, 100+ stops
+        place_types = list(dict.fromkeys(t for types in engine.MOOD_ACTIVITIES.values() for t in types))
+        plans = []
+        for loc in LOCATIONS:
+            lat, lng = map(float, loc.split(","))
+            results = engine.FETCH_SCHEDULER.map(
+                lambda t: engine.fetch_place_type(lat, lng, t, engine.DEFAULT_RADIUS), place_types)
+            place_ids = list(dict.fromkeys(r["place_id"] for page in results for r in page))
+            engine.FETCH_SCHEDULER.map(engine.get_place_details, place_ids)
+            plans.append(lambda loc=loc, place_ids=place_ids: engine.plan_itinerary(
+                place_ids, loc, start_minute=ITINERARY_START, visit_minutes=ITINERARY_VISIT_MINUTES))
+        return plans
+
+    return [
+        ("nearby_cold", nearby, True),
+        ("nearby_warm", nearby, False),
+        ("popular_cold", popular, True),
+        ("popular_warm", popular, False),
+        ("radius_sweep", radius_sweep, True),
+        ("radius_jump", radius_jump, True),
+        ("details_cold", details, "details"),
+        ("details_warm", details, False),
+        ("itinerary", itinerary, False),
+    ]
+
+
+def app_rerun_interactions(moods):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+
+    def click_mood(mood):
+        for button in at.button:
+            if button.label in (mood.upper(), f"⭐ {mood.upper()}"):
+                button.click().run()
+                return
+
+    interactions = [lambda: at.run(), lambda: at.text_input[0].input(CITIES[0]).run()]
+    interactions += [lambda mood=mood: click_mood(mood) for mood in moods]
+    interactions += [lambda: at.slider[0].set_value(3.5).run(),
+                     lambda: at.select_slider[0].set_value(10).run(),
+                     lambda: at.run()]
+    return interactions
+
+
+def print_report(results):
+    header = f"{'scenario':<16}{'n':>4}{'total ms':>11}{'median':>9}{'p95':>9}{'calls/int':>11}{'peak KB':>10}  cache hit rates"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        rates = ", ".join(f"{k}={v:.0%}" for k, v in sorted(r["cache_hit_rates"].items())) or "-"
+        print(f"{r['scenario']:<16}{r['interactions']:>4}{r['wall_ms_total']:>11.1f}{r['wall_ms_median']:>9.1f}"
+              f"{r['wall_ms_p95']:>9.1f}{r['upstream_calls_per_interaction']:>11.2f}{r['peak_memory_kb']:>10.1f}  {rates}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=30)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--quota-error-rate", type=float, default=0.0)
+    parser.add_argument("--recordings", help="directory of recorded <endpoint>.json responses")
+    parser.add_argument("--moods", default="bored,romantic,nature,cultural",
+                        help="comma-separated moods to exercise")
+    parser.add_argument("--page-token-delay", type=float, default=0.0,
+                        help="seconds to wait before following a page token (the real API needs ~2)")
+    parser.add_argument("--skip-app", action="store_true", help="skip the AppTest rerun scenario")
+    parser.add_argument("--json", help="write the results to this file as JSON")
+    args = parser.parse_args()
+
+    server = MockServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                        error_rate=args.error_rate, quota_error_rate=args.quota_error_rate,
+                        recordings_dir=args.recordings).start()
+    configure_environment(server, args)
+    import engine
+
+    moods = [m.strip() for m in args.moods.split(",") if m.strip()]
+    results = []
+    for name, build, cold in fetch_scenarios(engine, moods):
+        interactions = build()
+        if cold:
+            # Building the details id list fetched search results, so only drop the details cache
+            if cold == "details":
+                engine.PLACE_DETAILS_CACHE.clear()
+            else:
+                clear_caches()
+        results.append(run_scenario(server, name, interactions))
+
+    if not args.skip_app:
+        clear_caches()
+        results.append(run_scenario(server, "app_reruns", app_rerun_interactions(moods)))
+
+    server.stop()
+    print_report(results)
+    totals = Counter()
+    for r in results:
+        totals.update(r["upstream_calls"])
+    print(f"\nupstream calls: {dict(totals)}")
+    from http_client import coalescing_stats
+    print(f"coalesced requests: {coalescing_stats()}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", os.path.join(".cache", "smart_city.sqlite3"))
+DISK_ROWS_PER_ENTRY = 10  # default disk row cap, per entry held in memory
+PURGE_EVERY = 500  # disk writes between purges of expired and surplus rows
+
+
+class PersistentCache:
+    """In-memory LRU cache with per-entry TTL, backed by a shared SQLite file.
+
+    Entries missing from memory are looked up on disk, so several Streamlit
+    workers (and restarts) share warm entries. Negative entries record a
+    failed lookup and use their own, usually shorter, TTL.
+
+    With ``max_stale`` set, positive entries past their TTL are still served
+    for up to ``max_stale`` more seconds, flagged as stale so the caller can
+    refresh them in the background (stale-while-revalidate). Accesses per
+    key are counted only for such caches, or once ``ensure_refresher`` runs
+    for them, and only while the key is held in memory.
+
+    The disk store holds at most ``disk_maxsize`` rows per namespace (by
+    default ``DISK_ROWS_PER_ENTRY`` times ``maxsize``): every ``PURGE_EVERY``
+    writes, expired rows are deleted and then those expiring soonest until
+    the namespace fits.
+    """
+
+    def __init__(self, namespace, maxsize=1000, ttl=3600, negative_ttl=300, max_stale=0,
+                 db_path=CACHE_DB_PATH, disk_maxsize=None):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.disk_maxsize = disk_maxsize if disk_maxsize is not None else maxsize * DISK_ROWS_PER_ENTRY
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_stale = max_stale
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._db = None
+        self._writes = 0
+        self._refreshing = set()
+        self.access_counts = Counter()
+        self.track_access = bool(max_stale)
+        self.stats = {"hits": 0, "disk_hits": 0, "negative_hits": 0, "stale_hits": 0,
+                      "misses": 0, "evictions": 0, "expired": 0, "refreshes": 0, "purged": 0}
+        self._open_db()
+
+    # --------------------------
+    # Disk store
+    # --------------------------
+
+    def _open_db(self):
+        if not self.db_path:
+            return
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " negative INTEGER NOT NULL, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._db = db
+            self._purge()
+        except sqlite3.Error:
+            # Fall back to a memory-only cache if the file can't be used
+            self._db = None
+
+    def _purge(self):
+        """Delete this namespace's expired rows, then the soonest to expire beyond ``disk_maxsize``."""
+        expired = self._db.execute(
+            "DELETE FROM cache WHERE namespace = ?"
+            " AND expires_at + CASE negative WHEN 1 THEN 0 ELSE ? END < ?",
+            (self.namespace, self.max_stale, time.time()),
+        )
+        self.stats["purged"] += expired.rowcount
+        surplus = self._db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key IN ("
+            " SELECT key FROM cache WHERE namespace = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.disk_maxsize),
+        )
+        self.stats["purged"] += surplus.rowcount
+        self._db.commit()
+
+    def _disk_get(self, key):
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT value, negative, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        value, negative, expires_at = row
+        return json.loads(value), bool(negative), expires_at
+
+    def _disk_set(self, key, value, negative, expires_at):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, negative, expires_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), int(negative), expires_at),
+            )
+            self._db.commit()
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                self._purge()
+        except sqlite3.Error:
+            pass
+
+    def _disk_delete(self, key):
+        if self._db is None:
+            return
+        try:
+            self._db.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+            self._db.commit()
+        except sqlite3.Error:
+            pass
+
+    # --------------------------
+    # Public API
+    # --------------------------
+
+    def _remember(self, key, value, negative, expires_at):
+        self._entries[key] = (value, negative, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            evicted, _ = self._entries.popitem(last=False)
+            self.access_counts.pop(evicted, None)
+            self.stats["evictions"] += 1
+
+    def _hard_expiry(self, entry):
+        return entry[2] if entry[1] else entry[2] + self.max_stale
+
+    def lookup_entry(self, key):
+        """Return ``(found, value, stale)``; negative entries count as found."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._hard_expiry(entry) < now:
+                del self._entries[key]
+                self.access_counts.pop(key, None)
+                self.stats["expired"] += 1
+                entry = None
+            from_disk = False
+            if entry is None:
+                entry = self._disk_get(key)
+                if entry is not None and self._hard_expiry(entry) < now:
+                    self._disk_delete(key)
+                    self.stats["expired"] += 1
+                    entry = None
+                if entry is None:
+                    self.stats["misses"] += 1
+                    return False, None, False
+                from_disk = True
+
+            value, negative, expires_at = entry
+            if from_disk:
+                self._remember(key, value, negative, expires_at)
+                self.stats["disk_hits"] += 1
+            else:
+                self._entries.move_to_end(key)
+            stale = expires_at < now
+            if self.track_access:
+                self.access_counts[key] += 1
+            self.stats["negative_hits" if negative else "stale_hits" if stale else "hits"] += 1
+            return True, value, stale
+
+    def lookup(self, key):
+        """Return ``(found, value)``; negative and stale entries count as found."""
+        found, value, _ = self.lookup_entry(key)
+        return found, value
+
+    def peek(self, key, default=None):
+        """Return the in-memory value for ``key`` without touching stats, LRU order or expiry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else default
+
+    def expires_at(self, key):
+        """TTL expiry of the in-memory entry for ``key``, or None; like ``peek``, touches nothing."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[2] if entry is not None else None
+
+    def record_access(self, key):
+        """Count a use of ``key`` served from elsewhere (e.g. an index built from this cache)."""
+        with self._lock:
+            if self.track_access and key in self._entries:
+                self.access_counts[key] += 1
+
+    def get(self, key, default=None):
+        found, value = self.lookup(key)
+        return value if found else default
+
+    def set(self, key, value, negative=False):
+        expires_at = time.time() + (self.negative_ttl if negative else self.ttl)
+        with self._lock:
+            self._remember(key, value, negative, expires_at)
+            self._disk_set(key, value, negative, expires_at)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def refresh_in_background(self, key, refresh, submit):
+        """Schedule ``refresh(key)`` via ``submit`` unless a refresh of ``key`` is already pending.
+
+        ``refresh`` is expected to store the new value with ``set``. If it
+        returns a future instead, the refresh stays pending until that is done.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self.stats["refreshes"] += 1
+
+        def done(_=None):
+            with self._lock:
+                self._refreshing.discard(key)
+
+        def run():
+            pending = None
+            try:
+                pending = refresh(key)
+            finally:
+                if isinstance(pending, Future):
+                    pending.add_done_callback(done)
+                else:
+                    done()
+
+        submit(run)
+
+    def hot_keys_expiring(self, within, limit):
+        """Most-accessed positive keys whose TTL runs out in the next ``within`` seconds."""
+        deadline = time.time() + within
+        with self._lock:
+            expiring = [key for key, (_, negative, expires_at) in self._entries.items()
+                        if not negative and expires_at <= deadline and self.access_counts[key]]
+            expiring.sort(key=lambda k: self.access_counts[k], reverse=True)
+            return expiring[:limit]
+
+    def decay_access_counts(self):
+        """Halve access counts so the frequency ranking favours recent traffic."""
+        with self._lock:
+            for key in list(self.access_counts):
+                self.access_counts[key] //= 2
+                if not self.access_counts[key]:
+                    del self.access_counts[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.access_counts.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+                    self._db.commit()
+                except sqlite3.Error:
+                    pass
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(namespace, **options):
+    """Return the process-wide cache for ``namespace``, creating it on first use.
+
+    Streamlit re-executes the app script on every rerun, so caches must live
+    here rather than as module globals of app.py.
+    """
+    with _caches_lock:
+        if namespace not in _caches:
+            _caches[namespace] = PersistentCache(namespace, **options)
+        return _caches[namespace]
+
+
+_refreshers = {}
+
+
+def ensure_refresher(cache, refresh, submit, interval=60, lead_time=300, limit=20):
+    """Start, once per cache, a daemon thread that refreshes the hottest keys before they expire.
+
+    Every ``interval`` seconds the ``limit`` most-accessed keys expiring
+    within ``lead_time`` seconds are passed to ``refresh`` through
+    ``submit``. Calling again only swaps in the latest callables, which
+    keeps the thread current across Streamlit reruns.
+    """
+    with _caches_lock:
+        refresher = _refreshers.get(cache.namespace)
+        if refresher is not None:
+            refresher["refresh"], refresher["submit"] = refresh, submit
+            return
+        refresher = _refreshers[cache.namespace] = {"refresh": refresh, "submit": submit}
+        cache.track_access = True
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            for key in cache.hot_keys_expiring(lead_time, limit):
+                cache.refresh_in_background(key, refresher["refresh"], refresher["submit"])
+            cache.decay_access_counts()
+
+    threading.Thread(target=loop, daemon=True, name=f"refresh-{cache.namespace}").start()
+
+
+def all_caches():
+    """Snapshot of every cache created through get_cache, by namespace."""
+    with _caches_lock:
+        return dict(_caches)
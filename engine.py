@@ -0,0 +1,782 @@
+"""Recommendation engine behind the Streamlit page and the HTTP API.
+
+Fetching, caching, ranking and feedback live here with no dependency on the
+Streamlit runtime, so the same pipeline can serve the page, ``api.py`` and
+other services.
+"""
+import os
+import queue
+import time
+from concurrent.futures import Future
+from math import isfinite
+
+import requests
+from dotenv import load_dotenv
+
+import metrics
+import ranking
+from cache import get_cache, ensure_refresher, all_caches
+from geo import geohash_encode, geohash_decode, cell_half_diagonal, precision_for_radius
+from http_client import get_json, get_bytes, RETRY_STATUS_CODES
+from photos import get_photo_store, make_thumbnail
+from scheduler import get_scheduler, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from itinerary import open_periods, plan_route, VISIT_MINUTES
+from placeindex import PlaceIndex
+from places import Place
+from tables import PrecomputedSearches
+
+# Load API keys
+load_dotenv()
+OPENWEATHERMAP_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
+GOOGLE_PLACES_API_KEY = os.getenv("GOOGLE_PLACES_API_KEY")
+
+# Constants
+MOOD_ACTIVITIES = {
+    "bored": ["park", "museum", "amusement_park", "movie_theater"],
+    "excited": ["amusement_park", "stadium", "casino", "bowling_alley"],
+    "hungry": ["restaurant", "cafe", "bakery", "food_court"],
+    "romantic": ["spa", "restaurant", "park", "art_gallery"],
+    "adventurous": ["hiking_trail", "campground", "ski_resort", "climbing_gym"],
+    "cultural": ["museum", "art_gallery", "place_of_worship", "cultural_center"],
+    "shopping": ["shopping_mall", "clothing_store", "jewelry_store", "market"],
+    "relaxed": ["spa", "library", "book_store", "park"],
+    "sporty": ["gym", "stadium", "sports_complex", "swimming_pool"],
+    "nature": ["park", "zoo", "botanical_garden", "beach"],
+    "historical": ["temples","museum", "monument", "historical_landmark", "archaeological_site"],
+    "social": ["bar", "night_club", "bowling_alley", "karaoke_bar"],
+    "family": ["aquarium", "zoo", "playground", "family_entertainment_center"]
+}
+
+POPULAR_CATEGORIES = [
+    "tourist_attraction", "museum", "park", "landmark",
+    "shopping_mall", "art_gallery", "zoo", "church"
+]
+
+DEFAULT_RADIUS = 5000  # meters
+NEARBY_RESULTS_LIMIT = 15
+NEARBY_MAX_PAGES = 2  # nearby search pages (20 results each) read per place type, max 3
+PAGE_TOKEN_DELAY = float(os.getenv("PAGE_TOKEN_DELAY", 2))  # seconds before a next_page_token becomes valid
+PAGE_TOKEN_RETRIES = 2
+POPULAR_RESULTS_LIMIT = 10
+POPULAR_MIN_REVIEWS = 100
+MAX_CONCURRENT_REQUESTS = 10  # process-wide cap across all sessions
+FETCH_SCHEDULER = get_scheduler(MAX_CONCURRENT_REQUESTS)
+
+# Base URLs can be overridden, e.g. to point at the benchmark mock server
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com")
+OPENWEATHERMAP_BASE_URL = os.getenv("OPENWEATHERMAP_BASE_URL", "http://api.openweathermap.org")
+WEATHER_URL = f"{OPENWEATHERMAP_BASE_URL}/data/2.5/weather"
+GEOCODE_URL = f"{GOOGLE_MAPS_BASE_URL}/maps/api/geocode/json"
+NEARBY_SEARCH_URL = f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/nearbysearch/json"
+PLACE_DETAILS_URL = f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/details/json"
+PLACE_PHOTO_URL = f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/photo"
+PLACE_DETAILS_FIELDS = "name,geometry,formatted_address,website,formatted_phone_number,opening_hours,rating,reviews,photos"
+
+# Place Details cache: shared across reruns, workers and restarts
+PLACE_DETAILS_CACHE_SIZE = 2000
+PLACE_DETAILS_TTL = 24 * 3600  # seconds
+PLACE_DETAILS_NEGATIVE_TTL = 15 * 60  # seconds
+# Statuses that won't change on retry; transient ones (OVER_QUERY_LIMIT, UNKNOWN_ERROR) aren't cached
+PLACE_DETAILS_NEGATIVE_STATUSES = {"NOT_FOUND", "INVALID_REQUEST", "ZERO_RESULTS"}
+PLACE_DETAILS_CACHE = get_cache(
+    "place_details",
+    maxsize=PLACE_DETAILS_CACHE_SIZE,
+    ttl=PLACE_DETAILS_TTL,
+    negative_ttl=PLACE_DETAILS_NEGATIVE_TTL,
+)
+
+# Photos are fetched server-side once and served from a local content-addressed store
+PHOTO_MAX_WIDTH = 400  # pixels
+PHOTO_STORE = get_photo_store()
+PHOTO_INDEX = get_cache("photo_index", maxsize=10000, ttl=30 * 24 * 3600, negative_ttl=10 * 60)
+
+# Geocoding rarely changes; weather is only good for a few minutes
+GEOCODE_CACHE = get_cache("geocode", maxsize=5000, ttl=30 * 24 * 3600, negative_ttl=3600)
+WEATHER_CACHE = get_cache("weather", maxsize=2000, ttl=10 * 60, negative_ttl=2 * 60)
+WEATHER_COORD_DECIMALS = 2  # ~1 km grid for GPS weather lookups
+
+# Per-category nearby search pages, keyed on (place_type, geohash cell, radius)
+CATEGORY_CACHE_SIZE = 5000
+CATEGORY_TTL = 3600  # seconds before an entry is refreshed
+CATEGORY_MAX_STALE = 6 * 3600  # seconds a stale entry may still be served while it refreshes
+CATEGORY_NEGATIVE_TTL = 5 * 60  # seconds
+CATEGORY_REFRESH_INTERVAL = 60  # seconds between proactive refresh sweeps
+CATEGORY_REFRESH_LEAD_TIME = 5 * 60  # refresh hot entries this long before they go stale
+CATEGORY_REFRESH_LIMIT = 20  # hottest entries refreshed per sweep
+MAX_SEARCH_RADIUS = 50000  # Places API limit, meters
+CATEGORY_CACHE = get_cache(
+    "nearby_pages",
+    maxsize=CATEGORY_CACHE_SIZE,
+    ttl=CATEGORY_TTL,
+    negative_ttl=CATEGORY_NEGATIVE_TTL,
+    max_stale=CATEGORY_MAX_STALE,
+)
+
+# Every fetched search result, indexed by location, answers narrower searches it already contains
+PLACE_INDEX = PlaceIndex(ttl=CATEGORY_TTL, max_searches=CATEGORY_CACHE_SIZE)
+
+# Nearby search tables built offline by precompute.py are answered from before the cache or the API
+PRECOMPUTED_DIR = os.getenv("PRECOMPUTED_DIR")
+PRECOMPUTED_MAX_AGE = 30 * 24 * 3600  # seconds
+PRECOMPUTED = PrecomputedSearches(PRECOMPUTED_DIR, PRECOMPUTED_MAX_AGE) if PRECOMPUTED_DIR else None
+
+# --------------------------
+# Weather Functions
+# --------------------------
+
+def normalize_city(city):
+    return " ".join(city.lower().split())
+
+@metrics.timed("geocode")
+def geocode_city(city):
+    """Return "lat,lng" for a city name, or None if it can't be found."""
+    key = normalize_city(city)
+    found, location = GEOCODE_CACHE.lookup(key)
+    if found:
+        return location
+    
+    try:
+        response = get_json(GEOCODE_URL, params={"address": city, "key": GOOGLE_PLACES_API_KEY})
+    except Exception as exc:
+        metrics.inc("failures_total", operation="geocode", error=type(exc).__name__)
+        return None
+    
+    status = response.get("status")
+    if status == "OK":
+        coords = response["results"][0]["geometry"]["location"]
+        location = f"{coords['lat']},{coords['lng']}"
+        GEOCODE_CACHE.set(key, location)
+        return location
+    if status in ("ZERO_RESULTS", "INVALID_REQUEST"):
+        GEOCODE_CACHE.set(key, None, negative=True)
+    return None
+
+@metrics.timed("weather")
+def get_weather(city=None, lat=None, lng=None):
+    """Current weather for a city name or, failing that, for GPS coordinates."""
+    if city:
+        key = f"city:{normalize_city(city)}"
+        params = {"q": city}
+    else:
+        # Quantize GPS fixes so nearby readings share one cache entry
+        lat, lng = round(lat, WEATHER_COORD_DECIMALS), round(lng, WEATHER_COORD_DECIMALS)
+        key = f"coords:{lat},{lng}"
+        params = {"lat": lat, "lon": lng}
+    
+    found, weather = WEATHER_CACHE.lookup(key)
+    if found:
+        return weather
+    
+    params.update({"appid": OPENWEATHERMAP_API_KEY, "units": "metric"})
+    try:
+        data = get_json(WEATHER_URL, params=params)
+        if str(data["cod"]) == "200":
+            main = data["main"]
+            weather = {
+                "temp": main["temp"],
+                "feels_like": main["feels_like"],
+                "humidity": main["humidity"],
+                "main": data["weather"][0]["main"]
+            }
+            WEATHER_CACHE.set(key, weather)
+            return weather
+        if str(data["cod"]) == "404":
+            WEATHER_CACHE.set(key, None, negative=True)
+        return None
+    except Exception as exc:
+        metrics.inc("failures_total", operation="weather", error=type(exc).__name__)
+        return None
+
+def get_clothing_advice(temp):
+    if temp > 25:
+        return "Light clothing 🩳👕 and sunscreen"
+    elif temp > 15:
+        return "Light jacket 🧥 or sweater"
+    else:
+        return "Warm coat 🧥 and layers"
+
+# --------------------------
+# Core Functions
+# --------------------------
+
+@metrics.timed("place_details")
+def get_place_details(place_id):
+    found, details = PLACE_DETAILS_CACHE.lookup(place_id)
+    # Entries cached before coordinates and opening periods were stored are fetched again
+    if found and (not details or "open_periods" in details):
+        return details
+    
+    params = {"place_id": place_id, "fields": PLACE_DETAILS_FIELDS, "key": GOOGLE_PLACES_API_KEY}
+    try:
+        response = get_json(PLACE_DETAILS_URL, params=params)
+    except (requests.RequestException, ValueError) as exc:
+        metrics.inc("failures_total", operation="place_details", error=type(exc).__name__)
+        return {}
+    
+    if response.get("status") == "OK":
+        result = response["result"]
+        photos = [p['photo_reference'] for p in result.get('photos', [])[:3]]
+        location = result.get("geometry", {}).get("location", {})
+        
+        details = {
+            "name": result.get("name", ""),
+            "lat": location.get("lat"),
+            "lng": location.get("lng"),
+            "full_address": result.get("formatted_address", "N/A"),
+            "website": result.get("website", "N/A"),
+            "phone": result.get("formatted_phone_number", "N/A"),
+            "hours": "\n".join(result.get("opening_hours", {}).get("weekday_text", [])),
+            "open_periods": open_periods(result.get("opening_hours")),
+            "photos": photos,
+            "reviews": result.get("reviews", [])
+        }
+        PLACE_DETAILS_CACHE.set(place_id, details)
+        return details
+    
+    if response.get("status") in PLACE_DETAILS_NEGATIVE_STATUSES:
+        PLACE_DETAILS_CACHE.set(place_id, {}, negative=True)
+    return {}
+
+def compact_result(result):
+    """Keep only the nearby search fields the app reads."""
+    compact = {
+        "name": result["name"],
+        "place_id": result["place_id"],
+        "geometry": {"location": result["geometry"]["location"]},
+    }
+    if "rating" in result:
+        compact["rating"] = result["rating"]
+    if "user_ratings_total" in result:
+        compact["user_ratings_total"] = result["user_ratings_total"]
+    if result.get("photos"):
+        compact["photos"] = [{"photo_reference": result["photos"][0]["photo_reference"]}]
+    return compact
+
+def category_key(user_lat, user_lng, place_type, radius):
+    cell = geohash_encode(user_lat, user_lng, precision_for_radius(radius))
+    return f"{place_type}|{cell}|{radius}"
+
+def search_circle(key):
+    """Return ``(place_type, lat, lng, radius)`` actually searched for a category key."""
+    place_type, cell, radius = key.split("|")
+    center_lat, center_lng = geohash_decode(cell)
+    search_radius = min(int(int(radius) + cell_half_diagonal(len(cell), center_lat)), MAX_SEARCH_RADIUS)
+    return place_type, center_lat, center_lng, search_radius
+
+def index_search(key, entry, expires_at=None):
+    """Add a cached or precomputed search entry (None for a rejected search) to the place index.
+
+    Cached entries pass their own ``expires_at`` so the index never serves them past the cache.
+    """
+    pages, more = (entry["pages"], entry["more"]) if entry else ([], False)
+    PLACE_INDEX.add(key, *search_circle(key), pages, more, expires_at=expires_at,
+                    requested_radius=int(key.rsplit("|", 1)[1]))
+
+def iter_place_type_pages(user_lat, user_lng, place_type, radius, max_pages=1):
+    """Yield nearby search result pages for one place type, shared by every query in the same geohash cell.
+
+    The search runs from the cell centre with the radius widened to cover the
+    whole cell, so a few metres of GPS jitter or a different mood that shares
+    this type reuses the cached response. Callers filter the results to the
+    user's actual radius. Up to ``max_pages`` pages are read by following
+    ``next_page_token``.
+    """
+    key, pages = lookup_place_type_pages(user_lat, user_lng, place_type, radius, max_pages)
+    if pages is not None:
+        yield from pages
+        return
+    yield from fetch_category_pages(key, max_pages)
+
+def lookup_place_type_pages(user_lat, user_lng, place_type, radius, max_pages=1):
+    """Return ``(key, pages)`` for ``iter_place_type_pages`` without going upstream; pages is None if it must.
+
+    A wider search already in the place index that contains the whole query
+    circle answers it without a lookup of its own. Otherwise precomputed
+    tables are tried first, then the cache, whose stale entries are served
+    as-is and refreshed in the background.
+    """
+    key = category_key(user_lat, user_lng, place_type, radius)
+    indexed = PLACE_INDEX.query(place_type, user_lat, user_lng, radius, max_pages)
+    if indexed is not None:
+        covering_key, places = indexed
+        # Keeps the search hot for the refresher, which only sees cache lookups otherwise
+        CATEGORY_CACHE.record_access(covering_key)
+        metrics.inc("category_lookups_total", source="index")
+        return key, [places]
+    
+    precomputed = PRECOMPUTED.get(key) if PRECOMPUTED is not None else None
+    if precomputed and (len(precomputed["pages"]) >= max_pages or not precomputed["more"]):
+        metrics.inc("category_lookups_total", source="precomputed")
+        if key not in PLACE_INDEX:
+            index_search(key, precomputed)
+        return key, precomputed["pages"][:max_pages]
+    
+    found, cached, stale = CATEGORY_CACHE.lookup_entry(key)
+    if found and (cached is None or len(cached["pages"]) >= max_pages or not cached["more"]):
+        if stale:
+            CATEGORY_CACHE.refresh_in_background(key, refresh_category, submit_refresh)
+        metrics.inc("category_lookups_total", source="stale_cache" if stale else "cache")
+        # Stale entries stay out of the index so every use goes through the cache and its refresh
+        if not stale and key not in PLACE_INDEX:
+            index_search(key, cached, CATEGORY_CACHE.expires_at(key))
+        return key, cached["pages"][:max_pages] if cached else []
+    
+    # Page tokens can't be reused later, so a deeper request refetches from page one
+    metrics.inc("category_lookups_total", source="upstream")
+    return key, None
+
+def category_page_steps(key, max_pages):
+    """Fetch up to ``max_pages`` pages for a category key one request per step, then cache them.
+
+    Yields ``(page, wait)``: the page the request brought (None while a next
+    page token isn't valid yet) and the seconds to wait before the next step.
+    How to wait is up to the caller, see ``fetch_category_pages`` and
+    ``fetch_category_pages_async``.
+    """
+    place_type, center_lat, center_lng, search_radius = search_circle(key)
+    params = {
+        "location": f"{center_lat},{center_lng}",
+        "radius": search_radius,
+        "type": place_type,
+        "key": GOOGLE_PLACES_API_KEY,
+    }
+    pages = []
+    more = False
+    token_attempts = 0
+    while len(pages) < max_pages:
+        try:
+            response = get_json(NEARBY_SEARCH_URL, params=params)
+        except Exception as exc:
+            metrics.inc("failures_total", operation="nearby_search", error=type(exc).__name__)
+            break
+        status = response.get("status")
+        if status == "INVALID_REQUEST" and pages and token_attempts < PAGE_TOKEN_RETRIES:
+            # The next page token takes a moment to become valid
+            token_attempts += 1
+            yield None, PAGE_TOKEN_DELAY
+            continue
+        if status not in ("OK", "ZERO_RESULTS"):
+            if not pages and status not in ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR"):
+                CATEGORY_CACHE.set(key, None, negative=True)
+                index_search(key, None, CATEGORY_CACHE.expires_at(key))
+            break
+        
+        page = [compact_result(r) for r in response.get("results", [])]
+        pages.append(page)
+        token = response.get("next_page_token")
+        more = bool(token)
+        if not token or len(pages) >= max_pages:
+            yield page, 0
+            break
+        params = {"pagetoken": token, "key": GOOGLE_PLACES_API_KEY}
+        token_attempts = 0
+        yield page, PAGE_TOKEN_DELAY
+    
+    if pages:
+        CATEGORY_CACHE.set(key, {"pages": pages, "more": more})
+        index_search(key, {"pages": pages, "more": more}, CATEGORY_CACHE.expires_at(key))
+
+def fetch_category_pages(key, max_pages):
+    """Fetch up to ``max_pages`` pages for a category key, yielding each as it arrives, then cache them.
+
+    Waits for next page tokens in the calling thread, so scheduler tasks
+    fetching more than one page must use ``fetch_category_pages_async``.
+    """
+    for page, wait in category_page_steps(key, max_pages):
+        if page is not None:
+            yield page
+        time.sleep(wait)
+
+def fetch_category_pages_async(key, max_pages, on_page=None, priority=PRIORITY_NORMAL):
+    """Fetch pages like ``fetch_category_pages`` on FETCH_SCHEDULER; return a future for the list of pages.
+
+    Every request is its own task, resubmitted with a delay while a page
+    token becomes valid, so no worker sleeps. ``on_page(page)`` is called
+    from the worker as each page arrives.
+    """
+    steps = category_page_steps(key, max_pages)
+    pages = []
+    done = Future()
+    
+    def step():
+        try:
+            page, wait = next(steps)
+            if page is not None:
+                pages.append(page)
+                if on_page is not None:
+                    on_page(page)
+        except StopIteration:
+            done.set_result(pages)
+        except BaseException as exc:
+            done.set_exception(exc)
+        else:
+            FETCH_SCHEDULER.submit(step, priority=priority, delay=wait)
+    
+    FETCH_SCHEDULER.submit(step, priority=priority)
+    return done
+
+def refresh_category(key):
+    cached = CATEGORY_CACHE.peek(key)
+    max_pages = len(cached["pages"]) if cached else 1
+    return fetch_category_pages_async(key, max_pages, priority=PRIORITY_LOW)
+
+def submit_refresh(fn):
+    FETCH_SCHEDULER.submit(fn, priority=PRIORITY_LOW)
+
+# Keep the most requested searches warm so they rarely go stale at all
+ensure_refresher(CATEGORY_CACHE, refresh_category, submit_refresh,
+                 interval=CATEGORY_REFRESH_INTERVAL, lead_time=CATEGORY_REFRESH_LEAD_TIME,
+                 limit=CATEGORY_REFRESH_LIMIT)
+
+def collect_metrics():
+    """Cache, place index and scheduler figures for each metrics scrape."""
+    for name, cache in all_caches().items():
+        for event, value in cache.stats.items():
+            yield "cache_events_total", {"cache": name, "event": event}, value
+        yield "cache_entries", {"cache": name}, len(cache)
+    for event, value in PLACE_INDEX.stats.items():
+        yield "place_index_events_total", {"event": event}, value
+    yield "place_index_places", {}, len(PLACE_INDEX)
+    yield "scheduler_pending_tasks", {}, FETCH_SCHEDULER.pending()
+    yield "scheduler_delayed_tasks", {}, FETCH_SCHEDULER.delayed()
+
+metrics.register_collector(collect_metrics)
+
+def fetch_place_type(user_lat, user_lng, place_type, radius, max_pages=1):
+    return [r for page in iter_place_type_pages(user_lat, user_lng, place_type, radius, max_pages) for r in page]
+
+def get_photo(photo_ref, thumbnail=False, fetch=True):
+    """Image bytes for a Places photo, fetched server-side once and then served from the local store.
+
+    With ``fetch=False`` only already-stored photos are returned, so callers
+    that must not block can fall back to a placeholder.
+    """
+    key = f"{photo_ref}|{'thumb' if thumbnail else 'full'}"
+    found, digest = PHOTO_INDEX.lookup(key)
+    if found:
+        data = PHOTO_STORE.get(digest) if digest else None
+        # A digest whose file was evicted is fetched again below
+        if data or not digest:
+            return data
+    if not fetch:
+        return None
+    
+    if thumbnail:
+        full = get_photo(photo_ref)
+        if full is None:
+            return None
+        try:
+            data = make_thumbnail(full)
+        except OSError:
+            data = full
+    else:
+        params = {"maxwidth": PHOTO_MAX_WIDTH, "photoreference": photo_ref, "key": GOOGLE_PLACES_API_KEY}
+        try:
+            data = get_bytes(PLACE_PHOTO_URL, params=params)
+        except Exception as exc:
+            metrics.inc("failures_total", operation="photo", error=type(exc).__name__)
+            # Only a refused photo (e.g. an expired reference) is remembered; timeouts and 5xx are retried next time
+            response = getattr(exc, "response", None)
+            if (isinstance(exc, requests.HTTPError) and response is not None
+                    and 400 <= response.status_code < 500 and response.status_code not in RETRY_STATUS_CODES):
+                PHOTO_INDEX.set(key, None, negative=True)
+            return None
+    PHOTO_INDEX.set(key, PHOTO_STORE.put(data))
+    return data
+
+def warm_card_photos(places, priority=PRIORITY_NORMAL):
+    """Fetch the grid thumbnails concurrently so rendering never waits on them one by one."""
+    refs = [p.photo_reference for p in places if p.photo_reference]
+    FETCH_SCHEDULER.map(lambda ref: get_photo(ref, thumbnail=True), refs, priority=priority)
+
+def to_places(columns):
+    """Turn ranked columns into the place records the UI renders."""
+    return [Place(
+        place_id=columns["place_id"][i],
+        name=columns["name"][i],
+        type=columns["type"][i],
+        rating=float(columns["rating"][i]),
+        distance=float(columns["distance"][i]),
+        lat=float(columns["lat"][i]),
+        lng=float(columns["lng"][i]),
+        review_count=int(columns["review_count"][i]),
+        photo_reference=columns["photo_reference"][i],
+    ) for i in range(len(columns["place_id"]))]
+
+def rank_nearby(results_by_type, user_lat, user_lng, radius, min_rating):
+    ranked = ranking.rank(results_by_type, user_lat, user_lng, k=NEARBY_RESULTS_LIMIT,
+                          scorer=ranking.by_rating_then_distance, min_rating=min_rating,
+                          max_distance_km=radius / 1000)
+    return to_places(ranked)
+
+def stream_nearby_places(location, place_types, radius=DEFAULT_RADIUS, min_rating=4.0, max_pages=NEARBY_MAX_PAGES):
+    """Yield the ranked top results again each time a page of any place type arrives.
+
+    Every type is fetched concurrently, so the first cards can be shown
+    before the slowest type (or its later pages) has responded. The last
+    value yielded is the complete ranking.
+    """
+    user_lat, user_lng = map(float, location.split(','))
+    arrivals = queue.Queue()
+    
+    def process_place_type(place_type):
+        started = time.perf_counter()
+        
+        def finished(_=None):
+            metrics.record_span("category_fetch", time.perf_counter() - started,
+                                section="nearby", place_type=place_type)
+            arrivals.put((place_type, None))
+        
+        fetch = None
+        try:
+            key, pages = lookup_place_type_pages(user_lat, user_lng, place_type, radius, max_pages)
+            if pages is None:
+                fetch = fetch_category_pages_async(key, max_pages, lambda page: arrivals.put((place_type, page)),
+                                                   priority=PRIORITY_HIGH)
+            else:
+                for page in pages:
+                    arrivals.put((place_type, page))
+        finally:
+            # An upstream fetch goes on in later tasks; this one returns so its worker is free meanwhile
+            if fetch is None:
+                finished()
+            else:
+                fetch.add_done_callback(finished)
+    
+    for place_type in place_types:
+        FETCH_SCHEDULER.submit(process_place_type, place_type, priority=PRIORITY_HIGH)
+    
+    results = {place_type: [] for place_type in place_types}
+    pending = len(place_types)
+    yielded = False
+    while pending:
+        place_type, page = arrivals.get()
+        if page is None:
+            pending -= 1
+            continue
+        results[place_type].extend(page)
+        yield rank_nearby([(t, results[t]) for t in place_types], user_lat, user_lng, radius, min_rating)
+        yielded = True
+    
+    if not yielded:
+        yield []
+
+def get_nearby_places(location, place_types, radius=DEFAULT_RADIUS, min_rating=4.0, max_pages=NEARBY_MAX_PAGES):
+    places = []
+    for places in stream_nearby_places(location, place_types, radius, min_rating, max_pages):
+        pass
+    return places
+
+def get_popular_places(location, radius=DEFAULT_RADIUS):
+    user_lat, user_lng = map(float, location.split(','))
+    
+    # rankby=prominence is the API default, so these share cache entries with mood searches
+    def process_category(category):
+        with metrics.span("category_fetch", section="popular", place_type=category):
+            return fetch_place_type(user_lat, user_lng, category, radius)
+    
+    category_results = FETCH_SCHEDULER.map(process_category, POPULAR_CATEGORIES, priority=PRIORITY_NORMAL)
+    
+    ranked = ranking.rank(zip(POPULAR_CATEGORIES, category_results), user_lat, user_lng,
+                          k=POPULAR_RESULTS_LIMIT, scorer=ranking.by_rating_then_reviews,
+                          min_reviews=POPULAR_MIN_REVIEWS, max_distance_km=radius / 1000)
+    return to_places(ranked)
+
+# --------------------------
+# Feedback
+# --------------------------
+
+def generate_feedback(place, weather_data):
+    feedback = []
+    
+    
+    distance = place.distance
+    if distance < 1.0:
+        feedback.append("🚶 Conveniently located nearby")
+    elif distance < 3.0:
+        feedback.append("📍 Just a short trip away")
+    
+    if weather_data:
+        weather_condition = weather_data.get('main', '').lower()
+        temp = weather_data.get('temp', 20)
+        place_type = place.type
+        
+        if place_type in ['park', 'beach', 'botanical_garden', 'nature']:
+            if 'rain' not in weather_condition and temp > 15:
+                feedback.append("🌤️ Perfect for enjoying the nice weather")
+            elif 'rain' in weather_condition:
+                feedback.append("☔ Beautiful even in rain - bring an umbrella!")
+        elif place_type in ['museum', 'art_gallery', 'cultural_center']:
+            if 'rain' in weather_condition or temp < 15:
+                feedback.append("🏛️ Great indoor activity for today's weather")
+            else:
+                feedback.append("❄️ Cool escape from the heat")
+    
+    type_feedback = {
+        'spa': "💆 Relaxing ambience perfect for unwinding",
+        'amusement_park': "🎢 Exciting rides and fun atmosphere",
+        'restaurant': "🍽️ Known for delicious cuisine and great service",
+        'museum': "🎨 Rich in culture and history",
+        'park': "🌳 Peaceful natural surroundings",
+        'shopping_mall': "🛍️ Great variety of stores and amenities",
+        'tourist_attraction': "📸 Must-see spot in the area",
+        'landmark': "🏰 Iconic historical location",
+        'art_gallery': "🖼️ Explore beautiful artworks",
+        'zoo': "🐅 Family-friendly wildlife experience",
+        'church': "⛪ Architectural beauty and serenity",
+        'beach': "🏖️ Sandy shores and ocean views",
+        'hiking_trail': "🥾 Adventure with scenic trails",
+        'library': "📚 Quiet space for peaceful time"
+    }
+    place_type = place.type
+    feedback.append(type_feedback.get(place_type, "🌟 Great choice for your current mood"))
+    
+    return feedback[:3]
+
+# --------------------------
+# Recommendations
+# --------------------------
+
+def parse_location(location):
+    """Return (lat, lng) for a "lat,lng" string, or None if it isn't one."""
+    try:
+        lat, lng = map(float, location.split(','))
+    except (AttributeError, ValueError):
+        return None
+    if -90 <= lat <= 90 and -180 <= lng <= 180:
+        return lat, lng
+    return None
+
+def resolve_location(location=None, city=None):
+    """Return "lat,lng" for coordinates or a city name, or None if neither resolves."""
+    if location:
+        coords = parse_location(location)
+        return f"{coords[0]},{coords[1]}" if coords else None
+    if city:
+        return geocode_city(city)
+    return None
+
+def weather_for(location, city=None):
+    lat, lng = parse_location(location)
+    return get_weather(city) if city else get_weather(lat=lat, lng=lng)
+
+def recommend(location, mood, radius=DEFAULT_RADIUS, min_rating=4.0, weather=None):
+    """Top places for a mood around "lat,lng", as dicts with their feedback badges.
+
+    ``weather`` is the current weather at the location (see ``get_weather``);
+    without it the feedback only covers distance and place type.
+    """
+    if mood not in MOOD_ACTIVITIES:
+        raise ValueError(f"unknown mood: {mood}")
+    places = get_nearby_places(location, MOOD_ACTIVITIES[mood], radius=radius, min_rating=min_rating)
+    return [dict(place.to_dict(), feedback=generate_feedback(place, weather)) for place in places]
+
+def validate_search(radius=DEFAULT_RADIUS, min_rating=4.0):
+    """Return ``(radius, min_rating)`` as whole metres and a float, or raise ValueError if either is out of range."""
+    values = []
+    for name, value, low, high in (("radius", radius, 1, MAX_SEARCH_RADIUS), ("min_rating", min_rating, 0, 5)):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number")
+        if not (isfinite(value) and low <= value <= high):
+            raise ValueError(f"{name} must be between {low} and {high}")
+        values.append(value)
+    return int(values[0]), values[1]
+
+def batch_item(query, radius=DEFAULT_RADIUS, min_rating=4.0):
+    """The checked fields of one batch query, with an ``"error"`` if it can't be answered."""
+    item = {"location": None, "mood": query.get("mood"), "city": query.get("city")}
+    for field in ("location", "city", "mood"):
+        if query.get(field) is not None and not isinstance(query[field], str):
+            item["error"] = f"{field} must be a string"
+            return item
+    try:
+        item["radius"], item["min_rating"] = validate_search(query.get("radius", radius),
+                                                             query.get("min_rating", min_rating))
+    except ValueError as exc:
+        item["error"] = str(exc)
+        return item
+    if item["mood"] not in MOOD_ACTIVITIES:
+        item["error"] = f"unknown mood: {item['mood']}"
+    return item
+
+def recommend_batch(queries, radius=DEFAULT_RADIUS, min_rating=4.0):
+    """Answer many ``{"location" | "city", "mood", "radius", "min_rating"}`` queries at once.
+
+    Locations, weather and every distinct (place type, geohash cell) search
+    are fetched concurrently across the whole batch before anything is
+    ranked, so overlapping queries share upstream calls. Each result is
+    ``{"location", "mood", "weather", "places"}``, or ``{"location", "mood",
+    "error"}`` for a query that can't be answered.
+    """
+    items = [batch_item(query, radius, min_rating) for query in queries]
+    valid = [(query, item) for query, item in zip(queries, items) if "error" not in item]
+    locations = FETCH_SCHEDULER.map(
+        lambda pair: resolve_location(pair[0].get("location"), pair[0].get("city")),
+        valid, priority=PRIORITY_HIGH,
+    )
+    for (_, item), location in zip(valid, locations):
+        item["location"] = location
+        if location is None:
+            item["error"] = "location not found"
+    
+    answerable = [item for item in items if "error" not in item]
+    searches = {}
+    for item in answerable:
+        lat, lng = parse_location(item["location"])
+        for place_type in MOOD_ACTIVITIES[item["mood"]]:
+            key = category_key(lat, lng, place_type, item["radius"])
+            searches.setdefault(key, (lat, lng, place_type, item["radius"]))
+    # Searches that must go upstream page as delayed tasks, so only this thread waits on them
+    warmups = []
+    for key, (lat, lng, place_type, search_radius) in searches.items():
+        _, pages = lookup_place_type_pages(lat, lng, place_type, search_radius, NEARBY_MAX_PAGES)
+        if pages is None:
+            warmups.append(fetch_category_pages_async(key, NEARBY_MAX_PAGES, priority=PRIORITY_HIGH))
+    warmups += [FETCH_SCHEDULER.submit(weather_for, item["location"], item["city"], priority=PRIORITY_HIGH)
+                for item in answerable]
+    for warmup in warmups:
+        warmup.result()
+    
+    results = []
+    for item in items:
+        if "error" in item:
+            results.append({"location": item["location"], "mood": item["mood"], "error": item["error"]})
+            continue
+        # Served from the caches warmed above
+        weather = weather_for(item["location"], item["city"])
+        places = recommend(item["location"], item["mood"], item["radius"], item["min_rating"], weather)
+        results.append({"location": item["location"], "mood": item["mood"],
+                        "weather": weather, "places": places})
+    return results
+
+# --------------------------
+# Itineraries
+# --------------------------
+
+def plan_itinerary(place_ids, location=None, start_minute=9 * 60, mode="walking", visit_minutes=VISIT_MINUTES):
+    """Order places into a day route from "lat,lng" (see ``itinerary.plan_route``).
+
+    Coordinates and opening hours come from the place details cache, one
+    lookup per place; legs are computed locally. Each stop carries its
+    ``place_id`` and ``name``; places without coordinates or that can't be
+    fitted into their opening hours are listed under ``unscheduled``.
+    """
+    place_ids = list(dict.fromkeys(place_ids))
+    details = FETCH_SCHEDULER.map(get_place_details, place_ids, priority=PRIORITY_HIGH)
+    located = [i for i, d in enumerate(details) if d.get("lat") is not None and d.get("lng") is not None]
+    start = parse_location(location) if location else None
+    with metrics.span("itinerary", mode=mode):
+        plan = plan_route([details[i]["lat"] for i in located], [details[i]["lng"] for i in located],
+                          [details[i]["open_periods"] for i in located], start=start,
+                          start_minute=start_minute, mode=mode, visit_minutes=visit_minutes)
+    for stop in plan["stops"]:
+        i = located[stop.pop("index")]
+        stop["place_id"] = place_ids[i]
+        stop["name"] = details[i].get("name") or place_ids[i]
+        stop["lat"], stop["lng"] = details[i]["lat"], details[i]["lng"]
+    unscheduled = [place_ids[located[k]] for k in plan["unscheduled"]]
+    unscheduled += [place_ids[i] for i in sorted(set(range(len(place_ids))) - set(located))]
+    plan["unscheduled"] = unscheduled
+    return plan
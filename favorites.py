@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Kept apart from the cache file: clearing caches must not lose what users saved
+FAVORITES_DB_PATH = os.getenv("FAVORITES_DB_PATH", os.path.join(".data", "favorites.sqlite3"))
+
+
+class FavoritesStore:
+    """Saved place ids per user in a SQLite file shared by every worker.
+
+    Each place is stored once per user, as its id and the name it had when
+    saved, so the list can be shown without any lookups; details come from
+    the shared place details cache when needed.
+    """
+
+    def __init__(self, db_path=FAVORITES_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db = self._open_db()
+
+    def _open_db(self):
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+        except (sqlite3.Error, OSError):
+            # Keep favorites for this process only if the file can't be used
+            db = sqlite3.connect(":memory:", check_same_thread=False)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS favorites ("
+            " user_id TEXT NOT NULL, place_id TEXT NOT NULL, name TEXT NOT NULL DEFAULT '',"
+            " added_at REAL NOT NULL, PRIMARY KEY (user_id, place_id))"
+        )
+        columns = [row[1] for row in db.execute("PRAGMA table_info(favorites)")]
+        if "name" not in columns:
+            db.execute("ALTER TABLE favorites ADD COLUMN name TEXT NOT NULL DEFAULT ''")
+        db.commit()
+        return db
+
+    def add(self, user_id, place_id, name=""):
+        """Save ``place_id`` for ``user_id``; False if it was already saved."""
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO favorites (user_id, place_id, name, added_at) VALUES (?, ?, ?, ?)",
+                (user_id, place_id, name, time.time()),
+            )
+            self._db.commit()
+            return cursor.rowcount > 0
+
+    def remove(self, user_id, place_id):
+        with self._lock:
+            self._db.execute("DELETE FROM favorites WHERE user_id = ? AND place_id = ?", (user_id, place_id))
+            self._db.commit()
+
+    def list(self, user_id):
+        """``(place_id, name)`` pairs saved by ``user_id``, oldest first."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT place_id, name FROM favorites WHERE user_id = ? ORDER BY added_at", (user_id,)
+            ).fetchall()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_favorites_store(db_path=FAVORITES_DB_PATH):
+    """Return the process-wide store for ``db_path``, creating it on first use."""
+    with _stores_lock:
+        if db_path not in _stores:
+            _stores[db_path] = FavoritesStore(db_path)
+        return _stores[db_path]
@@ -0,0 +1,101 @@
+from math import cos, radians
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_INDEX = {c: i for i, c in enumerate(_BASE32)}
+
+# Approximate cell size in metres (width at the equator, height) per precision
+GEOHASH_CELL_SIZE = {
+    4: (39100, 19500),
+    5: (4890, 4890),
+    6: (1220, 610),
+    7: (153, 153),
+    8: (38.2, 19.1),
+}
+
+
+def geohash_encode(lat, lng, precision=6):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def geohash_bounds(geohash):
+    """Return ``(min_lat, min_lng, max_lat, max_lng)`` of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _BASE32_INDEX[char]
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (bits >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def geohash_decode(geohash):
+    """Return the centre ``(lat, lng)`` of a geohash cell."""
+    min_lat, min_lng, max_lat, max_lng = geohash_bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+
+
+def geohash_cell_degrees(precision):
+    """Return ``(height, width)`` of a geohash cell in degrees."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def geohash_cover(south, west, north, east, precision):
+    """Geohash cells at ``precision`` that together cover a bounding box, row by row from the south-west.
+
+    The box must not cross the antimeridian.
+    """
+    height, width = geohash_cell_degrees(precision)
+    min_lat, min_lng, _, _ = geohash_bounds(geohash_encode(south, west, precision))
+    cells = []
+    lat = min_lat + height / 2
+    while lat - height / 2 <= north and lat < 90:
+        lng = min_lng + width / 2
+        while lng - width / 2 <= east and lng < 180:
+            cells.append(geohash_encode(lat, lng, precision))
+            lng += width
+        lat += height
+    return cells
+
+
+def cell_half_diagonal(precision, lat=0.0):
+    """Upper bound, in metres, on the distance from a point to its cell centre."""
+    width, height = GEOHASH_CELL_SIZE[precision]
+    width *= max(cos(radians(lat)), 0.0)
+    return ((width / 2) ** 2 + (height / 2) ** 2) ** 0.5
+
+
+def precision_for_radius(radius):
+    """Pick the coarsest geohash precision whose cells stay small next to ``radius``."""
+    for precision in sorted(GEOHASH_CELL_SIZE):
+        if max(GEOHASH_CELL_SIZE[precision]) <= radius / 4:
+            return precision
+    return max(GEOHASH_CELL_SIZE)
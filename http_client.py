@@ -0,0 +1,148 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from ratelimit import RateLimiter
+from singleflight import SingleFlight
+
+# One pooled session per process: keeps TCP+TLS connections alive between calls
+POOL_CONNECTIONS = 4  # number of distinct hosts kept in the pool
+POOL_MAXSIZE = 10  # max open connections per host
+CONNECT_TIMEOUT = 3.05  # seconds
+READ_TIMEOUT = 10  # seconds
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5  # seconds
+BACKOFF_MAX = 8  # seconds
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Google APIs report throttling in the JSON body with a 200 status
+RETRY_API_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+OK_API_STATUSES = {"OK", "ZERO_RESULTS"}
+
+_session = None
+_session_lock = threading.Lock()
+# Identical requests in flight at the same time, from any session, share one upstream call
+_inflight = SingleFlight()
+# Optional cap on upstream requests per second, e.g. for offline batch jobs
+_rate_limiter = None
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # pool_block caps concurrent connections per host instead of opening extras
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                                      pool_maxsize=POOL_MAXSIZE, pool_block=True)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def set_rate_limit(per_second, burst=1):
+    """Hold every upstream request (retries included) to ``per_second``; ``None`` removes the limit."""
+    global _rate_limiter
+    _rate_limiter = RateLimiter(per_second, burst) if per_second else None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, honouring a Retry-After header if given."""
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def request_key(url, params=None):
+    return url, tuple(sorted((k, str(v)) for k, v in (params or {}).items()))
+
+
+def get_json(url, params=None, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=MAX_RETRIES):
+    """GET ``url`` through the shared session and return the decoded JSON body.
+
+    Connection errors, timeouts, 429/5xx responses and Google's
+    OVER_QUERY_LIMIT status are retried with backoff. Other error responses
+    are returned as-is so callers can inspect their status fields.
+    Concurrent identical requests are coalesced, so the returned body may be
+    shared with other callers and must not be mutated.
+    """
+    return _inflight.do(request_key(url, params), _fetch, url, params, timeout, retries, True)
+
+
+def get_bytes(url, params=None, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=MAX_RETRIES):
+    """GET ``url`` and return the raw body, e.g. an image; error responses raise."""
+    return _inflight.do(("bytes",) + request_key(url, params), _fetch, url, params, timeout, retries, False)
+
+
+def coalescing_stats():
+    return dict(_inflight.stats)
+
+
+def endpoint_name(url):
+    """Short metrics label for an API URL, e.g. "nearbysearch" or "weather"."""
+    parts = [p for p in urlparse(url).path.split("/") if p and p != "json"]
+    return parts[-1] if parts else "unknown"
+
+
+def _collect():
+    for name, value in coalescing_stats().items():
+        yield "coalesced_requests_total", {"outcome": name}, value
+
+
+metrics.register_collector(_collect)
+
+
+def _fetch(url, params, timeout, retries, as_json):
+    endpoint = endpoint_name(url)
+    with metrics.span("upstream", endpoint=endpoint):
+        return _fetch_attempts(endpoint, url, params, timeout, retries, as_json)
+
+
+def _fetch_attempts(endpoint, url, params, timeout, retries, as_json):
+    session = get_session()
+    for attempt in range(retries + 1):
+        last_attempt = attempt == retries
+        if attempt:
+            metrics.inc("upstream_retries_total", endpoint=endpoint)
+        if _rate_limiter is not None:
+            _rate_limiter.acquire()
+        metrics.inc("upstream_requests_total", endpoint=endpoint)
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            metrics.inc("upstream_errors_total", endpoint=endpoint,
+                        reason="timeout" if isinstance(exc, requests.Timeout) else "connection")
+            if last_attempt:
+                raise
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        if response.status_code >= 400:
+            metrics.inc("upstream_errors_total", endpoint=endpoint, reason=f"http_{response.status_code}")
+        if response.status_code in RETRY_STATUS_CODES:
+            if last_attempt:
+                response.raise_for_status()
+            time.sleep(backoff_delay(attempt, response.headers.get("Retry-After")))
+            continue
+
+        if not as_json:
+            response.raise_for_status()
+            return response.content
+
+        data = response.json()
+        status = data.get("status") if isinstance(data, dict) else None
+        if status is not None and status not in OK_API_STATUSES:
+            metrics.inc("upstream_errors_total", endpoint=endpoint, reason=status)
+        if status in RETRY_API_STATUSES and not last_attempt:
+            time.sleep(backoff_delay(attempt))
+            continue
+        return data
@@ -0,0 +1,277 @@
+"""Day itineraries over a set of places, planned locally.
+
+Legs come from one NumPy great-circle distance matrix, scaled by a detour
+factor and a travel speed, so planning never calls a routing API. The order
+starts as a nearest-neighbour tour and is improved with 2-opt (reversing a
+stretch of the route) and Or-opt (moving a run of up to three stops
+elsewhere) until neither helps. Stops with known opening hours are only
+visited while open, waiting for them to open if that takes at most
+``max_wait`` minutes; an improving move is kept only if every stop still
+fits and the day ends no later.
+
+Times are minutes from Sunday 00:00 in the places' local time, the
+convention of the Places API ``opening_hours.periods``.
+"""
+from bisect import bisect_left
+
+import numpy as np
+
+from ranking import haversine_matrix_km
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+TRAVEL_SPEEDS = {"walking": 4.5, "driving": 25.0}  # km/h, city averages
+DETOUR_FACTOR = 1.3  # street distance over straight-line distance
+VISIT_MINUTES = 45
+MAX_WAIT_MINUTES = 120  # longest wait for a stop to open before it is left out
+OR_OPT_SEGMENT = 3  # longest run of stops Or-opt moves
+MOVES_CHECKED = 3  # improving moves tried per position when opening hours apply
+MAX_PASSES = 50
+EPSILON = 1e-9
+
+
+def _minute_of_week(point):
+    time = point.get("time", "0000")
+    return int(point["day"]) * MINUTES_PER_DAY + int(time[:2]) * 60 + int(time[2:])
+
+
+def open_periods(opening_hours):
+    """``[[open, close], ...]`` minutes of the week for a Places ``opening_hours``, or None if unknown."""
+    periods = []
+    for period in (opening_hours or {}).get("periods") or []:
+        if "open" not in period:
+            continue
+        if not period.get("close"):
+            # A single open period without a close means open around the clock
+            return [[0, MINUTES_PER_WEEK]]
+        opens = _minute_of_week(period["open"])
+        closes = _minute_of_week(period["close"])
+        if closes <= opens:
+            closes += MINUTES_PER_WEEK
+        periods.append([opens, closes])
+    return sorted(periods) or None
+
+
+def opening_windows(periods):
+    """Sorted ``(opens, closes)`` lists of ``periods`` over three weeks, for ``earliest_start``."""
+    if periods is None:
+        return None
+    tiled = sorted((closes + offset, opens + offset)
+                   for offset in (-MINUTES_PER_WEEK, 0, MINUTES_PER_WEEK) for opens, closes in periods)
+    return [opens for _, opens in tiled], [closes for closes, _ in tiled]
+
+
+def earliest_start(windows, arrival, visit):
+    """First minute from ``arrival`` on when a ``visit``-minute stay fits ``windows``, or None."""
+    if windows is None:
+        return arrival
+    opens, closes = windows
+    week = arrival // MINUTES_PER_WEEK * MINUTES_PER_WEEK
+    minute = arrival - week
+    for k in range(bisect_left(closes, minute + visit), len(closes)):
+        start = max(minute, opens[k])
+        if start + visit <= closes[k]:
+            return week + start
+    return None
+
+
+class _Planner:
+    """Route state for one ``plan_route`` call.
+
+    Nodes ``0..n-1`` are the stops, ``n`` the start and ``n + 1`` a free end
+    with zero-length legs, so the open route is a closed tour through both.
+    Without a start location the start is free too.
+    """
+
+    def __init__(self, lats, lngs, hours, start, start_minute, speed, visit, max_wait):
+        n = len(lats)
+        points_lat = np.append(np.asarray(lats, dtype=float), start[0] if start else 0.0)
+        points_lng = np.append(np.asarray(lngs, dtype=float), start[1] if start else 0.0)
+        self.km = np.zeros((n + 2, n + 2))
+        self.km[:n + 1, :n + 1] = haversine_matrix_km(points_lat, points_lng) * DETOUR_FACTOR
+        if not start:
+            self.km[n, :] = self.km[:, n] = 0
+        self.minutes = self.km / speed * 60
+        self.windows = [opening_windows(periods) for periods in hours] + [None, None]
+        self.timed = any(h is not None for h in hours)
+        self.start, self.end = n, n + 1
+        self.start_minute = start_minute
+        self.visit = visit
+        self.max_wait = max_wait
+
+    def schedule(self, route, begin=1, clock=None):
+        """``[(arrival, start), ...]`` for the stops of ``route`` from position ``begin``, or None if one doesn't fit.
+
+        ``clock`` is the departure from position ``begin - 1``.
+        """
+        times = []
+        clock = self.start_minute if clock is None else clock
+        for prev, node in zip(route[begin - 1:-2], route[begin:-1]):
+            arrival = clock + self.minutes[prev, node]
+            start = earliest_start(self.windows[node], arrival, self.visit)
+            if start is None or start - arrival > self.max_wait:
+                return None
+            times.append((arrival, start))
+            clock = start + self.visit
+        return times
+
+    def nearest_neighbour(self, stops):
+        """Greedy route: always go to the stop that can be started soonest."""
+        route = [self.start]
+        remaining = np.asarray(stops, dtype=int)
+        clock = self.start_minute
+        while len(remaining):
+            arrivals = clock + self.minutes[route[-1], remaining]
+            best, pick = np.inf, None
+            # A stay starts no earlier than the arrival, so stop once arrivals pass the best start
+            for k in np.argsort(arrivals):
+                arrival = arrivals[k]
+                if arrival >= best:
+                    break
+                start = earliest_start(self.windows[remaining[k]], arrival, self.visit)
+                if start is not None and start - arrival <= self.max_wait and start < best:
+                    best, pick = start, k
+            if pick is None:
+                break
+            route.append(int(remaining[pick]))
+            remaining = np.delete(remaining, pick)
+            clock = best + self.visit
+        route.append(self.end)
+        return np.array(route), [int(node) for node in remaining]
+
+    def _reschedule(self, route, begin, end):
+        """Departures from position ``begin`` on for a changed route, or None if it isn't worth keeping.
+
+        Positions from ``end`` on hold the same stops as before, so once one
+        of them is left at the same time as before the rest of the day is too.
+        """
+        departures = []
+        clock = self.departures[begin - 1]
+        for position in range(begin, len(route) - 1):
+            arrival = clock + self.minutes[route[position - 1], route[position]]
+            start = earliest_start(self.windows[route[position]], arrival, self.visit)
+            if start is None or start - arrival > self.max_wait:
+                return None
+            clock = start + self.visit
+            if position >= end and abs(clock - self.departures[position]) <= EPSILON:
+                return departures + self.departures[position:]
+            departures.append(clock)
+        return departures if not departures or departures[-1] <= self.departures[-1] + EPSILON else None
+
+    def _accept(self, candidates, build):
+        """The route after the first of ``candidates``, best first, that keeps the schedule, or None.
+
+        ``build(move)`` returns the new route and the range of positions it
+        changed; stops before that keep their times, so only the rest of the
+        day is rescheduled.
+        """
+        for move in candidates:
+            new_route, begin, end = build(move)
+            if not self.timed:
+                return new_route
+            departures = self._reschedule(new_route, begin, end)
+            if departures is not None:
+                self.departures[begin:] = departures
+                return new_route
+        return None
+
+    def two_opt(self, route):
+        improved = False
+        d = self.minutes
+        for i in range(1, len(route) - 2):
+            a, b = route[i - 1], route[i]
+            c, following = route[i + 1:-1], route[i + 2:]
+            delta = d[a, c] + d[b, following] - d[a, b] - d[c, following]
+            candidates = np.flatnonzero(delta < -EPSILON)
+            if not len(candidates):
+                continue
+            candidates = candidates[np.argsort(delta[candidates])][:MOVES_CHECKED if self.timed else 1]
+            new_route = self._accept((i + 1 + k for k in candidates),
+                                     lambda j: (np.concatenate([route[:i], route[i:j + 1][::-1], route[j + 1:]]), i, j + 1))
+            if new_route is not None:
+                route = new_route
+                improved = True
+        return route, improved
+
+    def or_opt(self, route):
+        improved = False
+        d = self.minutes
+        for length in range(1, OR_OPT_SEGMENT + 1):
+            i = 1
+            while i + length < len(route):
+                segment = route[i:i + length]
+                first, last = segment[0], segment[-1]
+                prev, following = route[i - 1], route[i + length]
+                gain = d[prev, first] + d[last, following] - d[prev, following]
+                left, right = route[:-1], route[1:]
+                edges = d[left, right]
+                forward = d[left, first] + d[last, right] - edges
+                backward = d[left, last] + d[first, right] - edges
+                cost = np.minimum(forward, backward)
+                cost[i - 1:i + length] = np.inf  # edges into, inside and out of the segment
+                delta = cost - gain
+                candidates = np.flatnonzero(delta < -EPSILON)
+                if len(candidates):
+                    candidates = candidates[np.argsort(delta[candidates])][:MOVES_CHECKED if self.timed else 1]
+
+                    def build(k):
+                        moved = segment if forward[k] <= backward[k] else segment[::-1]
+                        if k < i:
+                            return np.concatenate([route[:k + 1], moved, route[k + 1:i], route[i + length:]]), k + 1, i + length
+                        return np.concatenate([route[:i], route[i + length:k + 1], moved, route[k + 1:]]), i, k + 1
+
+                    new_route = self._accept(candidates, build)
+                    if new_route is not None:
+                        route = new_route
+                        improved = True
+                i += 1
+        return route, improved
+
+    def improve(self, route):
+        if self.timed:
+            # Departure from each position of the current route; the start "departs" when the day begins
+            self.departures = [self.start_minute] + [start + self.visit for _, start in self.schedule(route)]
+        for _ in range(MAX_PASSES):
+            route, reversed_any = self.two_opt(route)
+            route, moved_any = self.or_opt(route)
+            if not (reversed_any or moved_any):
+                break
+        return route
+
+
+def plan_route(lats, lngs, hours=None, start=None, start_minute=9 * 60, mode="walking",
+               visit_minutes=VISIT_MINUTES, max_wait=MAX_WAIT_MINUTES):
+    """Order stops at ``(lats[i], lngs[i])`` into a short route through their opening hours.
+
+    ``hours`` holds each stop's ``open_periods`` (None where unknown),
+    ``start`` an optional ``(lat, lng)`` to leave from and ``start_minute``
+    the minute of the week the day begins. Returns ``{"stops": [{"index",
+    "arrival", "start", "departure", "leg_km"}, ...], "unscheduled": [index,
+    ...], "distance_km", "finish"}``; unscheduled stops could not be fitted
+    into their opening hours.
+    """
+    if mode not in TRAVEL_SPEEDS:
+        raise ValueError(f"unknown travel mode: {mode}")
+    if not visit_minutes > 0:
+        raise ValueError("visit_minutes must be positive")
+    n = len(lats)
+    hours = hours if hours is not None else [None] * n
+    planner = _Planner(lats, lngs, hours, start, start_minute, TRAVEL_SPEEDS[mode], visit_minutes, max_wait)
+    route, unscheduled = planner.nearest_neighbour(range(n))
+    route = planner.improve(route)
+
+    stops = []
+    for prev, node, (arrival, begin) in zip(route[:-2], route[1:-1], planner.schedule(route)):
+        stops.append({
+            "index": int(node),
+            "arrival": float(arrival),
+            "start": float(begin),
+            "departure": float(begin + visit_minutes),
+            "leg_km": float(planner.km[prev, node]),
+        })
+    return {
+        "stops": stops,
+        "unscheduled": unscheduled,
+        "distance_km": sum(stop["leg_km"] for stop in stops),
+        "finish": stops[-1]["departure"] if stops else float(start_minute),
+    }
@@ -0,0 +1,173 @@
+"""Process-wide counters, timing histograms and per-run traces.
+
+``span`` times a block and ``inc`` bumps a counter; both are also recorded
+in every ``trace`` active in the calling context, so a Streamlit rerun can
+see what it alone cost. ``render_prometheus`` formats everything in the
+Prometheus text format, including values reported by collectors, e.g. the
+cache statistics.
+"""
+import contextvars
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "smart_city_"
+# Seconds; covers cache hits through slow paginated searches
+SPAN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_lock = threading.Lock()
+_counters = Counter()  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., count, sum]
+_collectors = []
+_active_traces = contextvars.ContextVar("active_traces", default=())
+_server = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] += value
+    for trace in _active_traces.get():
+        trace["counters"][key] += value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(SPAN_BUCKETS) + 2)
+        for i, bound in enumerate(SPAN_BUCKETS):
+            if value <= bound:
+                histogram[i] += 1
+        histogram[-2] += 1
+        histogram[-1] += value
+
+
+@contextmanager
+def span(name, **labels):
+    """Time the block into the ``span_seconds`` histogram and any active traces."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start, **labels)
+
+
+def record_span(name, seconds, **labels):
+    """Record a span timed by the caller, e.g. one that ends in another scheduler task."""
+    observe("span_seconds", seconds, span=name, **labels)
+    for trace in _active_traces.get():
+        trace["spans"].append((name, labels, seconds))
+
+
+def timed(name, **labels):
+    """Decorator form of ``span`` for plain (non-generator) functions."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def trace():
+    """Collect the spans and counters recorded in this context, including scheduler tasks it submits.
+
+    Yields ``{"spans": [(name, labels, seconds), ...], "counters": Counter}``
+    with counter keys as ``(name, ((label, value), ...))``. Traces nest.
+    """
+    collected = {"spans": [], "counters": Counter(), "started": time.time()}
+    token = _active_traces.set(_active_traces.get() + (collected,))
+    try:
+        yield collected
+    finally:
+        _active_traces.reset(token)
+
+
+def register_collector(collect):
+    """Add ``collect()``, returning ``(name, labels, value)`` tuples, to every scrape.
+
+    Registering the same function again is a no-op, so callers re-executed
+    on each Streamlit rerun can register unconditionally.
+    """
+    with _lock:
+        if collect not in _collectors:
+            _collectors.append(collect)
+
+
+def counters():
+    with _lock:
+        return Counter(_counters)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def render_prometheus():
+    with _lock:
+        counter_items = sorted(_counters.items())
+        histogram_items = sorted((k, list(v)) for k, v in _histograms.items())
+        collectors = list(_collectors)
+
+    lines = []
+    typed = set()
+    for (name, labels), value in counter_items:
+        if name not in typed:
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            typed.add(name)
+        lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+    for (name, labels), histogram in histogram_items:
+        if name not in typed:
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            typed.add(name)
+        for bound, count in zip(SPAN_BUCKETS, histogram):
+            lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+        lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram[-2]}")
+        lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {histogram[-2]}")
+        lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {histogram[-1]:.6f}")
+    for collect in collectors:
+        for name, labels, value in collect():
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}{name} {'counter' if name.endswith('_total') else 'gauge'}")
+                typed.add(name)
+            lines.append(f"{PREFIX}{name}{_format_labels(_key(name, labels)[1])} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        payload = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve ``/metrics`` from a daemon thread, once per process."""
+    global _server
+    with _lock:
+        if _server is not None:
+            return _server
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, daemon=True, name="metrics").start()
+    return _server
@@ -0,0 +1,107 @@
+import hashlib
+import io
+import os
+import threading
+
+from PIL import Image
+
+PHOTO_CACHE_DIR = os.getenv("PHOTO_CACHE_DIR", os.path.join(".cache", "photos"))
+PHOTO_CACHE_MAX_BYTES = 200 * 1024 * 1024
+THUMBNAIL_WIDTH = 320  # pixels, for the card grid
+THUMBNAIL_QUALITY = 80
+
+
+class PhotoStore:
+    """Size-bounded, content-addressed photo files on disk.
+
+    Files are named by the SHA-256 of their bytes, so identical images are
+    stored once. When the total size passes ``max_bytes`` the least recently
+    read files are deleted first.
+    """
+
+    def __init__(self, directory=PHOTO_CACHE_DIR, max_bytes=PHOTO_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total = sum(os.path.getsize(p) for p in self._files())
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".tmp"):
+                    yield os.path.join(root, name)
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, digest):
+        path = self._path(digest)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mtime doubles as last-access time for eviction
+            return data
+        except OSError:
+            return None
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so other workers never read a partial file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._total += len(data)
+            if self._total > self.max_bytes:
+                self._evict()
+        return digest
+
+    def _evict(self):
+        files = []
+        for path in self._files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        self._total = sum(size for _, size, _ in files)
+        # Trim to 90% so eviction doesn't run on every write
+        target = self.max_bytes * 0.9
+        for _, size, path in files:
+            if self._total <= target:
+                break
+            try:
+                os.remove(path)
+                self._total -= size
+            except OSError:
+                pass
+
+
+def make_thumbnail(data, width=THUMBNAIL_WIDTH, quality=THUMBNAIL_QUALITY):
+    """Downscale an image to ``width`` pixels wide and re-encode it as JPEG."""
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        if image.width > width:
+            image.thumbnail((width, width * image.height // image.width))
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=quality, optimize=True)
+        return out.getvalue()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_photo_store(directory=PHOTO_CACHE_DIR, max_bytes=PHOTO_CACHE_MAX_BYTES):
+    """Return the process-wide store for ``directory``, creating it on first use."""
+    with _stores_lock:
+        if directory not in _stores:
+            _stores[directory] = PhotoStore(directory, max_bytes)
+        return _stores[directory]
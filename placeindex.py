@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from math import asin, cos, radians, sin, sqrt
+
+import numpy as np
+
+from geo import geohash_cover, geohash_encode
+from ranking import haversine_km
+
+INDEX_PRECISION = 5  # ~4.9 km grid cells
+METERS_PER_DEGREE = 111320
+EARTH_RADIUS_M = 6371000
+
+
+class Coverage:
+    """One nearby search held by the index: the circle it searched and what it returned."""
+
+    __slots__ = ("place_type", "lat", "lng", "radius", "requested_radius", "pages", "more", "place_ids", "expires_at")
+
+    def __init__(self, place_type, lat, lng, radius, requested_radius, pages, more, place_ids, expires_at):
+        self.place_type = place_type
+        self.lat = lat
+        self.lng = lng
+        self.radius = radius
+        self.requested_radius = requested_radius
+        self.pages = pages
+        self.more = more
+        self.place_ids = place_ids
+        self.expires_at = expires_at
+
+    def contains(self, lat, lng, radius):
+        """True if the circle ``radius`` metres around ``(lat, lng)`` lies inside this search."""
+        dlat = radians(lat - self.lat)
+        dlng = radians(lng - self.lng)
+        a = sin(dlat / 2) ** 2 + cos(radians(self.lat)) * cos(radians(lat)) * sin(dlng / 2) ** 2
+        distance = 2 * EARTH_RADIUS_M * asin(sqrt(min(a, 1.0)))
+        return distance + radius <= self.radius
+
+
+class PlaceIndex:
+    """Places from every nearby search, on a geohash grid, with a record of the area each search covered.
+
+    ``query`` answers a (place type, point, radius) question from memory when
+    an indexed search of that type already contains the whole circle, and
+    returns None otherwise so the caller searches upstream. A search only
+    answers queries at least ``1 / max_radius_ratio`` of the radius it was
+    requested with: Places returns the most prominent results, not all of
+    them, so a much wider search would leave a small circle sparsely filled.
+
+    Searches expire after ``ttl`` seconds, and the oldest are dropped beyond
+    ``max_searches``; places go with the last search that returned them.
+    """
+
+    def __init__(self, ttl=3600, max_searches=5000, max_radius_ratio=4, precision=INDEX_PRECISION):
+        self.ttl = ttl
+        self.max_searches = max_searches
+        self.max_radius_ratio = max_radius_ratio
+        self.precision = precision
+        self._searches = OrderedDict()  # key -> Coverage, oldest first
+        self._searches_by_type = {}  # place type -> set of keys
+        self._places = {}  # place_id -> (compact nearby result, geohash cell)
+        self._types = {}  # place_id -> Counter of place types, counted per search
+        self._cells = {}  # geohash cell -> set of place_ids
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "misses": 0, "searches_added": 0, "searches_dropped": 0}
+
+    def __len__(self):
+        return len(self._places)
+
+    def __contains__(self, key):
+        with self._lock:
+            coverage = self._searches.get(key)
+            return coverage is not None and coverage.expires_at > time.time()
+
+    def add(self, key, place_type, lat, lng, radius, pages, more, expires_at=None, requested_radius=None):
+        """Index the pages one search (``key``) returned from ``radius`` metres around ``(lat, lng)``.
+
+        ``requested_radius`` is the radius the search was made for, if it was
+        widened (e.g. to cover a whole geohash cell); ``max_radius_ratio``
+        applies to it. The search is dropped at ``expires_at``, by default
+        ``ttl`` seconds from now.
+        """
+        results = [r for page in pages for r in page]
+        with self._lock:
+            self._drop(key)
+            for result in results:
+                place_id = result["place_id"]
+                if place_id in self._places:
+                    cell = self._places[place_id][1]
+                else:
+                    location = result["geometry"]["location"]
+                    cell = geohash_encode(location["lat"], location["lng"], self.precision)
+                    self._cells.setdefault(cell, set()).add(place_id)
+                    self._types[place_id] = Counter()
+                # The latest search has the freshest rating and review count
+                self._places[place_id] = (result, cell)
+                self._types[place_id][place_type] += 1
+            self._searches[key] = Coverage(place_type, lat, lng, radius,
+                                           requested_radius if requested_radius is not None else radius,
+                                           len(pages), more,
+                                           [r["place_id"] for r in results],
+                                           expires_at if expires_at is not None else time.time() + self.ttl)
+            self._searches_by_type.setdefault(place_type, set()).add(key)
+            self.stats["searches_added"] += 1
+            while len(self._searches) > self.max_searches:
+                self._drop(next(iter(self._searches)))
+
+    def _drop(self, key):
+        coverage = self._searches.pop(key, None)
+        if coverage is None:
+            return
+        self.stats["searches_dropped"] += 1
+        self._searches_by_type[coverage.place_type].discard(key)
+        for place_id in coverage.place_ids:
+            types = self._types.get(place_id)
+            if types is None:
+                continue
+            types[coverage.place_type] -= 1
+            if types[coverage.place_type] <= 0:
+                del types[coverage.place_type]
+            if not types:
+                _, cell = self._places.pop(place_id)
+                del self._types[place_id]
+                self._cells[cell].discard(place_id)
+                if not self._cells[cell]:
+                    del self._cells[cell]
+
+    def covering_search(self, place_type, lat, lng, radius, max_pages=1):
+        """Key of an indexed search of ``place_type`` holding the whole circle, at least ``max_pages`` deep, or None."""
+        now = time.time()
+        with self._lock:
+            for key in list(self._searches_by_type.get(place_type, ())):
+                coverage = self._searches[key]
+                if coverage.expires_at <= now:
+                    self._drop(key)
+                    continue
+                if (coverage.requested_radius <= radius * self.max_radius_ratio
+                        and (coverage.pages >= max_pages or not coverage.more)
+                        and coverage.contains(lat, lng, radius)):
+                    return key
+        return None
+
+    def places_within(self, place_type, lat, lng, radius, min_rating=None):
+        """Indexed places of ``place_type`` within ``radius`` metres of ``(lat, lng)``."""
+        dlat = radius / METERS_PER_DEGREE
+        dlng = radius / (METERS_PER_DEGREE * max(np.cos(np.radians(lat)), 0.01))
+        cells = geohash_cover(max(lat - dlat, -90), max(lng - dlng, -180),
+                              min(lat + dlat, 90), min(lng + dlng, 180), self.precision)
+        with self._lock:
+            candidates = [self._places[place_id][0] for cell in cells for place_id in self._cells.get(cell, ())
+                          if self._types[place_id].get(place_type)]
+        if not candidates:
+            return []
+        lats = [r["geometry"]["location"]["lat"] for r in candidates]
+        lngs = [r["geometry"]["location"]["lng"] for r in candidates]
+        keep = haversine_km(lat, lng, lats, lngs) * 1000 <= radius
+        if min_rating is not None:
+            keep &= np.array([r.get("rating", 0) >= min_rating for r in candidates])
+        return [r for r, k in zip(candidates, keep) if k]
+
+    def query(self, place_type, lat, lng, radius, max_pages=1, min_rating=None):
+        """``(key, places)`` answering the query from memory, or None if the index doesn't cover it.
+
+        ``key`` is the indexed search that covered the query.
+        """
+        key = self.covering_search(place_type, lat, lng, radius, max_pages)
+        if key is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return key, self.places_within(place_type, lat, lng, radius, min_rating)
+
+    def clear(self):
+        with self._lock:
+            self._searches.clear()
+            self._searches_by_type.clear()
+            self._places.clear()
+            self._types.clear()
+            self._cells.clear()
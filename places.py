@@ -0,0 +1,36 @@
+class Place:
+    """One ranked result as the page and the API see it.
+
+    Slotted, so a result list costs a fixed handful of fields per place
+    rather than a dict each; details, photos and favorites are looked up by
+    ``place_id`` in the shared caches and stores instead of hanging off it.
+    """
+
+    __slots__ = ("place_id", "name", "type", "rating", "distance", "lat", "lng", "review_count", "photo_reference")
+
+    def __init__(self, place_id, name, type, rating, distance, lat, lng, review_count, photo_reference=None):
+        self.place_id = place_id
+        self.name = name
+        self.type = type
+        self.rating = rating
+        self.distance = distance
+        self.lat = lat
+        self.lng = lng
+        self.review_count = review_count
+        self.photo_reference = photo_reference
+
+    def __repr__(self):
+        return f"Place({self.place_id!r}, {self.name!r})"
+
+    def to_dict(self):
+        """JSON form, as served by the API."""
+        return {
+            "name": self.name,
+            "type": self.type,
+            "rating": self.rating,
+            "distance": self.distance,
+            "coordinates": {"lat": self.lat, "lng": self.lng},
+            "place_id": self.place_id,
+            "review_count": self.review_count,
+            "photo_reference": self.photo_reference,
+        }
@@ -0,0 +1,143 @@
+"""Offline precompute of nearby search tables for a city grid.
+
+Tiles a bounding box, or the area around each city, into the geohash cells
+the engine keys its searches on and runs the nearby search for every mood and
+popular place type in every cell. Searches are spread over worker processes,
+each fetching on the engine's scheduler under a share of the ``--rate``
+budget, and written as Parquet parts (see ``tables.py``). Searches already in
+the output directory are skipped, so an interrupted run resumes where it
+stopped.
+
+    python -m precompute --cities "Paris,Tokyo" --out precomputed --processes 4 --rate 20
+    python -m precompute --bbox 48.80,2.25,48.91,2.42 --out precomputed
+
+Serve the result by starting the app or API with PRECOMPUTED_DIR=precomputed.
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from math import cos, radians
+
+import engine
+import tables
+from geo import geohash_cover, geohash_decode, precision_for_radius
+
+CHECKPOINT_EVERY = 50  # searches per written part, the unit of resume
+CITY_RADIUS = 10000  # meters around each city centre
+DEFAULT_RATE = 10  # upstream requests per second, across all processes
+METERS_PER_DEGREE = 111320
+
+
+def all_place_types():
+    place_types = [t for types in engine.MOOD_ACTIVITIES.values() for t in types] + engine.POPULAR_CATEGORIES
+    return list(dict.fromkeys(place_types))
+
+
+def city_bbox(city, radius=CITY_RADIUS):
+    location = engine.geocode_city(city)
+    if location is None:
+        return None
+    lat, lng = map(float, location.split(','))
+    dlat = radius / METERS_PER_DEGREE
+    dlng = radius / (METERS_PER_DEGREE * max(cos(radians(lat)), 0.01))
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+
+def plan(bboxes, radius, place_types):
+    """Category keys for every place type in every cell covering ``bboxes``."""
+    precision = precision_for_radius(radius)
+    cells = dict.fromkeys(cell for bbox in bboxes for cell in geohash_cover(*bbox, precision))
+    keys = []
+    for cell in cells:
+        lat, lng = geohash_decode(cell)
+        keys += [engine.category_key(lat, lng, place_type, radius) for place_type in place_types]
+    return keys
+
+
+def search_result(key, pages):
+    """``(key, pages, more)`` for a finished search, or None if it failed and should be retried."""
+    found, cached = engine.CATEGORY_CACHE.lookup(key)
+    if pages:
+        return key, pages, bool(cached and cached["more"])
+    # Searches the API rejects outright (e.g. an unsupported type) are stored empty, like the cache does
+    if found and cached is None:
+        return key, [], False
+    return None
+
+
+def run_chunk(keys, out_dir, max_pages):
+    """Worker process entry point: run ``keys`` concurrently and write them out as one part."""
+    # Waiting here rather than on the scheduler keeps its workers free between pages
+    fetches = [engine.fetch_category_pages_async(key, max_pages) for key in keys]
+    results = [search_result(key, fetch.result()) for key, fetch in zip(keys, fetches)]
+    finished = [r for r in results if r is not None]
+    tables.write_part(out_dir, finished)
+    return len(finished), len(keys) - len(finished)
+
+
+def init_worker(rate):
+    from http_client import set_rate_limit
+    set_rate_limit(rate)
+
+
+def parse_bbox(value):
+    south, west, north, east = map(float, value.split(','))
+    if not (south < north and west < east):
+        raise argparse.ArgumentTypeError("expected south,west,north,east")
+    return south, west, north, east
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    area = parser.add_mutually_exclusive_group(required=True)
+    area.add_argument("--bbox", type=parse_bbox, action="append", help="south,west,north,east (repeatable)")
+    area.add_argument("--cities", help="comma-separated city names")
+    parser.add_argument("--city-radius", type=int, default=CITY_RADIUS, help="meters around each city centre")
+    parser.add_argument("--out", required=True, help="output directory for the Parquet parts")
+    parser.add_argument("--radius", type=int, default=engine.DEFAULT_RADIUS, help="search radius in meters")
+    parser.add_argument("--max-pages", type=int, default=engine.NEARBY_MAX_PAGES)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help="upstream requests per second across all processes (0 for no limit)")
+    parser.add_argument("--dry-run", action="store_true", help="only print how many searches would run")
+    args = parser.parse_args()
+
+    if args.cities:
+        bboxes = []
+        for city in (c.strip() for c in args.cities.split(",") if c.strip()):
+            bbox = city_bbox(city, args.city_radius)
+            if bbox is None:
+                print(f"Could not geocode {city!r}, skipping", file=sys.stderr)
+            else:
+                bboxes.append(bbox)
+    else:
+        bboxes = args.bbox
+
+    keys = plan(bboxes, args.radius, all_place_types())
+    completed = tables.completed_keys(args.out)
+    pending = [key for key in keys if key not in completed]
+    print(f"{len(keys)} searches planned, {len(keys) - len(pending)} already done, {len(pending)} to run")
+    if args.dry_run or not pending:
+        return
+
+    processes = max(1, min(args.processes, len(pending)))
+    chunks = [pending[i:i + CHECKPOINT_EVERY] for i in range(0, len(pending), CHECKPOINT_EVERY)]
+    started = time.perf_counter()
+    done = failed = 0
+    # Spawned workers open their own engine, connection pool and SQLite handles
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_worker, initargs=(args.rate / processes,)) as pool:
+        futures = [pool.submit(run_chunk, chunk, args.out, args.max_pages) for chunk in chunks]
+        for future in as_completed(futures):
+            chunk_done, chunk_failed = future.result()
+            done += chunk_done
+            failed += chunk_failed
+            print(f"  {done + failed}/{len(pending)} searches finished", flush=True)
+    print(f"Wrote {done} searches to {args.out} in {time.perf_counter() - started:.1f}s; "
+          f"{failed} failed and will be retried on the next run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Distances in km from one point to arrays of points."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    dlat = lat2 - lat1
+    dlng = np.radians(np.asarray(lngs, dtype=float) - lng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def haversine_matrix_km(lats, lngs):
+    """Pairwise distances in km between points, as an ``n x n`` matrix."""
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    return haversine_km(lats[:, None], lngs[:, None], lats, lngs)
+
+
+def to_columns(results_by_type):
+    """Flatten ``{place_type: [raw nearby result, ...]}`` into columnar arrays."""
+    rows = [(place_type, r) for place_type, results in results_by_type for r in results]
+    n = len(rows)
+    columns = {
+        "place_id": np.empty(n, dtype=object),
+        "name": np.empty(n, dtype=object),
+        "type": np.empty(n, dtype=object),
+        "photo_reference": np.empty(n, dtype=object),
+        "lat": np.empty(n),
+        "lng": np.empty(n),
+        "rating": np.empty(n),
+        "review_count": np.empty(n, dtype=np.int64),
+    }
+    for i, (place_type, r) in enumerate(rows):
+        location = r["geometry"]["location"]
+        photos = r.get("photos")
+        columns["place_id"][i] = r["place_id"]
+        columns["name"][i] = r["name"]
+        columns["type"][i] = place_type
+        columns["photo_reference"][i] = photos[0]["photo_reference"] if photos else None
+        columns["lat"][i] = location["lat"]
+        columns["lng"][i] = location["lng"]
+        columns["rating"][i] = r.get("rating", 0)
+        columns["review_count"][i] = r.get("user_ratings_total", 0)
+    return columns
+
+
+def take(columns, index):
+    return {name: values[index] for name, values in columns.items()}
+
+
+def dedupe(columns):
+    """Keep the first row for each place_id, preserving input order."""
+    if len(columns["place_id"]) == 0:
+        return columns
+    _, first = np.unique(columns["place_id"].astype(str), return_index=True)
+    return take(columns, np.sort(first))
+
+
+# --------------------------
+# Scorers
+# --------------------------
+# A scorer maps the columns to sort keys, most significant first; higher ranks first.
+
+def by_rating_then_distance(columns):
+    return columns["rating"], -columns["distance"]
+
+
+def by_rating_then_reviews(columns):
+    return columns["rating"], columns["review_count"]
+
+
+def weighted_score(rating_weight=1.0, reviews_weight=0.2, decay_km=5.0):
+    """Blend rating, log review count and an exponential distance decay into one key."""
+    def scorer(columns):
+        score = (rating_weight * columns["rating"]
+                 + reviews_weight * np.log1p(columns["review_count"]))
+        return (score * np.exp(-columns["distance"] / decay_km),)
+    return scorer
+
+
+def top_k(keys, k):
+    """Indices of the k best rows under lexicographic ``keys``, best first.
+
+    The primary key is partitioned first so only rows that can reach the
+    top k (ties included) are fully sorted.
+    """
+    primary = keys[0]
+    n = len(primary)
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if n > k:
+        kth = np.partition(primary, n - k)[n - k]
+        candidates = np.nonzero(primary >= kth)[0]
+    else:
+        candidates = np.arange(n)
+    # lexsort is ascending with the last key most significant
+    order = np.lexsort([-key[candidates] for key in reversed(keys)])
+    return candidates[order[:k]]
+
+
+def rank(results_by_type, user_lat, user_lng, k, scorer=by_rating_then_distance,
+         min_rating=None, min_reviews=None, max_distance_km=None):
+    """Filter, dedupe and rank raw nearby results; returns the top k as columns."""
+    columns = to_columns(results_by_type)
+    mask = np.ones(len(columns["place_id"]), dtype=bool)
+    if min_rating is not None:
+        mask &= columns["rating"] >= min_rating
+    if min_reviews is not None:
+        mask &= columns["review_count"] >= min_reviews
+    columns = dedupe(take(columns, mask))
+    columns["distance"] = haversine_km(user_lat, user_lng, columns["lat"], columns["lng"])
+    if max_distance_km is not None:
+        columns = take(columns, columns["distance"] <= max_distance_km)
+    return take(columns, top_k(scorer(columns), k))
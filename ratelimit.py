@@ -0,0 +1,29 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket shared by every thread in the process.
+
+    ``acquire`` blocks until a token is available, so callers are held to
+    ``rate`` calls per second on average with bursts of up to ``burst``.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,108 @@
+import contextvars
+import heapq
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Lower numbers run first
+PRIORITY_HIGH = 0  # on-screen results, e.g. the selected mood
+PRIORITY_NORMAL = 1  # secondary sections, e.g. popular places
+PRIORITY_LOW = 2  # speculative work, e.g. prefetch
+
+DEFAULT_MAX_WORKERS = 10
+
+
+class FetchScheduler:
+    """Bounded, priority-ordered thread pool shared by every session.
+
+    Tasks must not block on other tasks from the same scheduler, otherwise
+    a full pool can deadlock waiting on work that never gets a thread. Work
+    that has to wait a while before it can go on (e.g. for a page token to
+    become valid) resubmits itself with a ``delay`` rather than sleeping.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._threads = []
+        self._lock = threading.Lock()
+        # Delayed tasks as (due, task), moved onto the queue by one timer thread
+        self._delayed = []
+        self._delayed_changed = threading.Condition()
+        self._timer = None
+
+    def _start_workers(self):
+        with self._lock:
+            while len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._worker, daemon=True,
+                                          name=f"fetch-worker-{len(self._threads)}")
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            _, _, future, context, fn, args, kwargs = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = context.run(fn, *args, **kwargs)
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+    def _release_delayed(self):
+        while True:
+            with self._delayed_changed:
+                while not self._delayed or self._delayed[0][0] > time.monotonic():
+                    self._delayed_changed.wait(self._delayed[0][0] - time.monotonic() if self._delayed else None)
+                _, task = heapq.heappop(self._delayed)
+            self._queue.put(task)
+
+    def submit(self, fn, *args, priority=PRIORITY_NORMAL, delay=0, **kwargs):
+        """Queue ``fn(*args, **kwargs)``; with ``delay`` it is queued only after that many seconds."""
+        if len(self._threads) < self.max_workers:
+            self._start_workers()
+        future = Future()
+        # Tasks run in the submitter's context, so per-run metrics traces follow them
+        context = contextvars.copy_context()
+        task = (priority, next(self._counter), future, context, fn, args, kwargs)
+        if delay <= 0:
+            self._queue.put(task)
+            return future
+        with self._delayed_changed:
+            if self._timer is None:
+                self._timer = threading.Thread(target=self._release_delayed, daemon=True, name="fetch-timer")
+                self._timer.start()
+            heapq.heappush(self._delayed, (time.monotonic() + delay, task))
+            self._delayed_changed.notify()
+        return future
+
+    def map(self, fn, iterable, priority=PRIORITY_NORMAL):
+        """Run ``fn`` over ``iterable`` concurrently; results keep input order."""
+        futures = [self.submit(fn, item, priority=priority) for item in iterable]
+        return [future.result() for future in futures]
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def delayed(self):
+        with self._delayed_changed:
+            return len(self._delayed)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(max_workers=DEFAULT_MAX_WORKERS):
+    """Return the process-wide scheduler, creating it on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = FetchScheduler(max_workers)
+    return _scheduler
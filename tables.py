@@ -0,0 +1,140 @@
+"""Parquet tables of precomputed nearby searches.
+
+Each part written by ``precompute.py`` is a pair of files sharing an id:
+``places-<id>.parquet`` holds one row per result, and ``searches-<id>.parquet``
+one row per finished search. The searches file is written last, so a part
+only counts once both files are complete; its keys are the checkpoint an
+interrupted run resumes from.
+"""
+import glob
+import os
+import time
+import uuid
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PLACES_SCHEMA = pa.schema([
+    ("key", pa.string()),
+    ("page", pa.int8()),
+    ("place_id", pa.string()),
+    ("name", pa.string()),
+    ("lat", pa.float64()),
+    ("lng", pa.float64()),
+    ("rating", pa.float64()),
+    ("review_count", pa.int32()),
+    ("photo_reference", pa.string()),
+])
+SEARCHES_SCHEMA = pa.schema([
+    ("key", pa.string()),
+    ("pages", pa.int8()),
+    ("more", pa.bool_()),
+    ("fetched_at", pa.float64()),
+])
+
+
+def _write(table, path):
+    tmp = f"{path}.tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+
+
+def write_part(directory, searches, fetched_at=None):
+    """Write finished searches, given as ``(key, pages, more)``, as one new part."""
+    if not searches:
+        return None
+    fetched_at = fetched_at or time.time()
+    places = {name: [] for name in PLACES_SCHEMA.names}
+    for key, pages, _ in searches:
+        for page_number, page in enumerate(pages):
+            for result in page:
+                location = result["geometry"]["location"]
+                photos = result.get("photos")
+                places["key"].append(key)
+                places["page"].append(page_number)
+                places["place_id"].append(result["place_id"])
+                places["name"].append(result["name"])
+                places["lat"].append(location["lat"])
+                places["lng"].append(location["lng"])
+                places["rating"].append(result.get("rating"))
+                places["review_count"].append(result.get("user_ratings_total"))
+                places["photo_reference"].append(photos[0]["photo_reference"] if photos else None)
+
+    os.makedirs(directory, exist_ok=True)
+    part = uuid.uuid4().hex[:16]
+    _write(pa.table(places, schema=PLACES_SCHEMA), os.path.join(directory, f"places-{part}.parquet"))
+    _write(pa.table({
+        "key": [key for key, _, _ in searches],
+        "pages": [len(pages) for _, pages, _ in searches],
+        "more": [more for _, _, more in searches],
+        "fetched_at": [fetched_at] * len(searches),
+    }, schema=SEARCHES_SCHEMA), os.path.join(directory, f"searches-{part}.parquet"))
+    return part
+
+
+def _search_parts(directory):
+    for path in glob.glob(os.path.join(directory, "searches-*.parquet")):
+        yield path, os.path.join(directory, "places-" + os.path.basename(path)[len("searches-"):])
+
+
+def completed_keys(directory):
+    """Keys of every search already written to ``directory``."""
+    keys = set()
+    for path, _ in _search_parts(directory):
+        keys.update(pq.read_table(path, columns=["key"]).column("key").to_pylist())
+    return keys
+
+
+def _to_result(row):
+    """Rebuild the compact nearby search result the engine caches."""
+    result = {
+        "name": row["name"],
+        "place_id": row["place_id"],
+        "geometry": {"location": {"lat": row["lat"], "lng": row["lng"]}},
+    }
+    if row["rating"] is not None:
+        result["rating"] = row["rating"]
+    if row["review_count"] is not None:
+        result["user_ratings_total"] = row["review_count"]
+    if row["photo_reference"]:
+        result["photos"] = [{"photo_reference": row["photo_reference"]}]
+    return result
+
+
+class PrecomputedSearches:
+    """Nearby search pages read from a precompute output directory.
+
+    Entries are keyed and shaped like the engine's category cache,
+    ``{"pages": [[result, ...], ...], "more": bool}``. Searches older than
+    ``max_age`` seconds are left out so they fall back to live calls.
+    """
+
+    def __init__(self, directory, max_age=None):
+        self.directory = directory
+        self._searches = {}
+        fetched = {}
+        cutoff = time.time() - max_age if max_age else 0
+        for searches_path, places_path in _search_parts(directory):
+            searches = [s for s in pq.read_table(searches_path).to_pylist() if s["fetched_at"] >= cutoff]
+            if not searches:
+                continue
+            rows = {}
+            if os.path.exists(places_path):
+                for row in pq.read_table(places_path).to_pylist():
+                    rows.setdefault(row["key"], []).append(row)
+            for search in searches:
+                key = search["key"]
+                # A search repeated in a later run replaces the older one
+                if fetched.get(key, 0) > search["fetched_at"]:
+                    continue
+                pages = [[] for _ in range(search["pages"])]
+                for row in rows.get(key, []):
+                    pages[row["page"]].append(_to_result(row))
+                self._searches[key] = {"pages": pages, "more": search["more"]}
+                fetched[key] = search["fetched_at"]
+
+    def get(self, key):
+        return self._searches.get(key)
+
+    def __len__(self):
+        return len(self._searches)